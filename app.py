@@ -6,6 +6,8 @@ import os
 from dotenv import load_dotenv
 from flask import Flask, request, redirect, session, jsonify, json
 from supabase_client import supabase_anon, supabase_service
+from utils.compute import cancel_session_tasks
+from utils.entitlements import invalidate_subscription_status
 import stripe
 import flask
 
@@ -249,11 +251,15 @@ def handle_new_subscription(stripe_customer_id, supabase_id, subscription_status
         "stripe_customer_id": stripe_customer_id,
         "subscription_status": subscription_status
     }).eq("id", supabase_id).execute()
+    invalidate_subscription_status([supabase_id])
 
 def handle_cancel_subscription(stripe_customer_id, subscription_status):
-    supabase_service.table("user_profiles").update({
+    response = supabase_service.table("user_profiles").update({
         "subscription_status": subscription_status
     }).eq("stripe_customer_id", stripe_customer_id).execute()
+    # the update returns the changed profiles; without them, drop every cached status
+    user_ids = [row["id"] for row in response.data or [] if "id" in row]
+    invalidate_subscription_status(user_ids or None)
 
 
 @server.route('/webhook', methods=['POST'])
@@ -375,6 +381,13 @@ clientside_callback(
 def save_user_esssion(url):
     return session.get("user"), session.get("access_token")
 
+# ------------------------- cancel queued analytics from the page the user just left -----------------------------------
+@app.callback(
+    Input('url', 'pathname'),
+)
+def cancel_stale_compute(url):
+    cancel_session_tasks(keep_page=url)
+
 
 
 if __name__ == "__main__":
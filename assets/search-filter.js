@@ -0,0 +1,4 @@
+var dmcfuncs = window.dashMantineFunctions = window.dashMantineFunctions || {};
+
+// header search: options are already matched and ranked server-side (fuzzy), so show them as they come
+dmcfuncs.serverSideFilter = ({ options }) => options;
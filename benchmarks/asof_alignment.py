@@ -0,0 +1,71 @@
+"""
+Benchmark: nearest-date alignment of a 5-year daily price series onto a monthly trend.
+
+This is the get_corr_companies access pattern (every daily bar aligned to its nearest trend date).
+Compares the old per-date Python loop against nearest_date_positions / align_to_nearest_dates.
+
+Run from the repo root:
+    python -m benchmarks.asof_alignment
+"""
+import timeit
+import numpy as np
+import pandas as pd
+from utils.helpers import adjust_to_nearest_dates, align_to_nearest_dates
+
+
+def adjust_to_nearest_dates_loop(df1, df2):
+    """The original implementation: one searchsorted per row of df1."""
+    ref_dates = df2.index.sort_values().unique()
+
+    adjusted_index = []
+    for d in df1.index:
+        pos = ref_dates.searchsorted(d)
+        if pos == 0:
+            adjusted_index.append(ref_dates[0])
+        elif pos == len(ref_dates):
+            adjusted_index.append(ref_dates[-1])
+        else:
+            before, after = ref_dates[pos - 1], ref_dates[pos]
+            adjusted_index.append(before if abs(d - before) <= abs(after - d) else after)
+
+    df1 = df1.copy()
+    df1.index = adjusted_index
+    return df1
+
+
+def make_data(years=5, seed=0):
+    rng = np.random.default_rng(seed)
+    days = pd.bdate_range(end="2025-09-30", periods=252 * years)
+    df_price = pd.DataFrame({"close": 100 + np.cumsum(rng.normal(size=len(days)))}, index=days)
+    months = pd.date_range(end="2025-10-01", periods=12 * years + 1, freq="MS")
+    df_trend = pd.DataFrame({"trend_volume": rng.integers(1_000, 100_000, len(months))}, index=months)
+    return df_price, df_trend
+
+
+def main(repeat=5, number=20):
+    df_price, df_trend = make_data()
+    price_dates = df_price.index.values.astype("datetime64[D]")
+    trend_dates = df_trend.index.values.astype("datetime64[D]")
+    trend_volume = df_trend["trend_volume"].to_numpy()
+
+    # sanity check: all implementations agree
+    expected = adjust_to_nearest_dates_loop(df_price, df_trend).index.values.astype("datetime64[D]")
+    assert (adjust_to_nearest_dates(df_price, df_trend).index.values.astype("datetime64[D]") == expected).all()
+    assert (align_to_nearest_dates(price_dates, trend_dates, trend_volume)[0] == expected).all()
+
+    cases = {
+        "python loop (old)": lambda: adjust_to_nearest_dates_loop(df_price, df_trend),
+        "adjust_to_nearest_dates": lambda: adjust_to_nearest_dates(df_price, df_trend),
+        "align_to_nearest_dates": lambda: align_to_nearest_dates(price_dates, trend_dates, trend_volume),
+    }
+
+    print(f"{len(df_price)} daily bars -> {len(df_trend)} monthly trend dates")
+    baseline = None
+    for name, fn in cases.items():
+        best = min(timeit.repeat(fn, repeat=repeat, number=number)) / number
+        baseline = baseline or best
+        print(f"{name:<26} {best * 1e3:9.3f} ms   {baseline / best:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
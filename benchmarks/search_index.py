@@ -0,0 +1,78 @@
+"""
+Benchmark: header search over 100k options (companies and trends).
+
+Compares the dropdown's client-side substring filter (a scan over every label, as the browser did it) with
+SearchIndex.search, which answers exact, prefix and fuzzy (trigram) queries from an inverted index. The index has to
+answer in under 10 ms per query.
+
+Run from the repo root:
+    python -m benchmarks.search_index
+"""
+import time
+import timeit
+import numpy as np
+from utils.search_index import SearchIndex, build_entries
+
+SYLLABLES = ["pex", "mo", "ap", "ple", "tek", "no", "vi", "da", "ro", "bo", "tics", "sol", "ar", "gen", "ix", "lu",
+             "na", "mi", "cro", "soft", "nex", "ta", "ka", "zen", "ion", "tra", "fin", "co", "med", "bio"]
+SUFFIXES = ["Inc", "Holdings", "Group", "Ltd", "Corp", "International", "Technologies", "AG", "SA", "PLC"]
+QUERIES = {
+    "exact ticker": "aapl.us",
+    "prefix": "pop",
+    "multi-word": "pop mart international",
+    "typo": "popmrt",
+    "typo in keyword": "labubo",
+    "short": "a",
+    "no match": "qqqqqq",
+}
+
+
+def make_rows(n=100_000, seed=0):
+    rng = np.random.default_rng(seed)
+
+    def word():
+        return "".join(rng.choice(SYLLABLES, rng.integers(1, 4)))
+
+    kw_companies = [{'ticker_id': "AAPL.US", 'full_name': "Apple Inc"},
+                    {'ticker_id': "9992.HK", 'full_name': "Pop Mart International Group Ltd"}]
+    kw_companies += [{'ticker_id': f"{word()[:4].upper()}{i}.US", 'full_name': f"{word().title()} {rng.choice(SUFFIXES)}"}
+                     for i in range(n // 2 - len(kw_companies))]
+    kw_joined = [{'keyword': "labubu", 'type': "tiktok"}]
+    kw_joined += [{'keyword': " ".join(word() for _ in range(rng.integers(1, 4))), 'type': "google"}
+                  for _ in range(n - len(kw_companies) - len(kw_joined))]
+    return kw_companies, kw_joined
+
+
+def substring_filter(labels, query, k=20):
+    """The old behaviour: every option shipped to the browser, kept when its label contains the typed text."""
+    query = query.lower()
+    return [label for label in labels if query in label][:k]
+
+
+def main(repeat=5, number=20):
+    kw_companies, kw_joined = make_rows()
+    entries = build_entries(kw_companies, kw_joined)
+    labels = [entry['label'].lower() for entry in entries]
+
+    started = time.perf_counter()
+    index = SearchIndex(load=lambda: entries, version=lambda: 1)
+    index.refresh()
+    print(f"{len(entries)} options, index built in {time.perf_counter() - started:.2f} s")
+
+    # sanity check: typos still find the right option
+    assert index.search("popmrt")[0]['label'] == "Company: Pop Mart International Group Ltd (9992.HK)"
+    assert index.search("labubo")[0]['label'] == "Trend: labubu (tiktok)"
+    assert index.search("aapl.us")[0]['label'] == "Company: Apple Inc (AAPL.US)"
+
+    print(f"{'query':<36} {'substring scan':>15} {'SearchIndex':>12}")
+    worst = 0
+    for name, query in QUERIES.items():
+        scan = min(timeit.repeat(lambda: substring_filter(labels, query), repeat=repeat, number=number)) / number
+        best = min(timeit.repeat(lambda: index.search(query), repeat=repeat, number=number)) / number
+        worst = max(worst, best)
+        print(f"{name + ' (' + query + ')':<36} {scan * 1e3:12.3f} ms {best * 1e3:9.3f} ms")
+    print(f"slowest SearchIndex query: {worst * 1e3:.3f} ms ({'under' if worst < 0.010 else 'OVER'} the 10 ms budget)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Benchmark: one discover-callback query with a fresh Supabase client per request vs. the shared connection pool.
+
+"per-request client" is how every callback used to run: a new Client (and its own HTTP/2 connection) the first time
+supabase_service was touched in the request. "shared service client" is the process-wide client, and "per-request
+anon client" a fresh anon client on the shared transport, which is how supabase_anon now runs.
+
+With SUPABASE_URL / SUPABASE_SERVICE_ROLE_KEY set it queries that project (read-only: one kw_joined page, the
+generate_cards query). Without them it starts a local PostgREST stand-in on 127.0.0.1; plain HTTP over loopback shows
+the client construction and TCP connect cost but not the TLS handshake a real project adds to every new connection.
+
+Run from the repo root:
+    python -m benchmarks.supabase_clients
+"""
+import os
+import json
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import numpy as np
+from gotrue import SyncMemoryStorage
+from supabase.client import Client, ClientOptions
+
+
+class _PostgrestStandIn(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like PostgREST behind Supabase's gateway
+    disable_nagle_algorithm = True  # headers and body go out in separate writes
+    body = json.dumps([{"keyword": f"keyword {i}", "type": "google"} for i in range(9)]).encode()
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Range", "0-8/*")
+        self.send_header("Content-Length", str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stand_in():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _PostgrestStandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+
+def query(client):
+    """The generate_cards page query."""
+    return client.table("kw_joined").select("keyword, type").limit(9).execute().data
+
+
+def timed(fn, n):
+    times = []
+    for _ in range(n):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    return np.array(times) * 1e3
+
+
+def main(n=200):
+    if not os.getenv("SUPABASE_URL"):
+        os.environ["SUPABASE_URL"] = start_stand_in()
+        os.environ["SUPABASE_ANON_KEY"] = os.environ["SUPABASE_SERVICE_ROLE_KEY"] = "benchmark-key"
+        print(f"no SUPABASE_URL: using a local PostgREST stand-in at {os.environ['SUPABASE_URL']}")
+    import supabase_client  # reads SUPABASE_URL and the keys at import
+
+    url, service_key, anon_key = (supabase_client.SUPABASE_URL, supabase_client.SUPABASE_SERVICE_ROLE_KEY,
+                                  supabase_client.SUPABASE_ANON_KEY)
+
+    def per_request_client():
+        # the old create_supabase_client (memory storage: there's no Flask session here)
+        query(Client(url, service_key, options=ClientOptions(storage=SyncMemoryStorage(), flow_type="pkce")))
+
+    def per_request_anon():
+        query(supabase_client.create_supabase_client(anon_key, storage=SyncMemoryStorage()))
+
+    cases = {
+        "per-request client (old)": per_request_client,
+        "per-request anon client": per_request_anon,
+        "shared service client": lambda: query(supabase_client.get_supabase_service()),
+    }
+
+    for fn in cases.values():  # warm imports and the shared pool
+        fn()
+    print(f"{n} requests each")
+    print(f"{'':<26} {'mean':>9} {'p50':>9} {'p95':>9}")
+    for name, fn in cases.items():
+        ms = timed(fn, n)
+        print(f"{name:<26} {ms.mean():6.2f} ms {np.percentile(ms, 50):6.2f} ms {np.percentile(ms, 95):6.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
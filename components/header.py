@@ -1,7 +1,8 @@
-from dash import dcc, Input, Output, clientside_callback, callback, html
+from dash import dcc, Input, Output, State, clientside_callback, callback, html
 import dash_mantine_components as dmc
 from dash_iconify import DashIconify
 from supabase_client import supabase_anon, supabase_service
+from utils.search_index import SearchIndex, build_entries, fetch_rows, fetch_version
 
 burger = dmc.Burger(id="burger-button", size="sm", hiddenFrom="md", opened=False),
 
@@ -11,6 +12,7 @@ dropdown = dmc.Select(
     clearable=True,
     searchable=True,
     allowDeselect=True,
+    filter={"function": "serverSideFilter"},  # matching and ranking happen in utils.search_index
 )
 
 theme_toggle = dmc.Switch(
@@ -125,36 +127,26 @@ header = dmc.Grid(
     align="center",
 )
 
+# built once per worker from kw_companies / kw_joined and rebuilt when their row counts change
+search_index = SearchIndex(
+    load=lambda: build_entries(
+        fetch_rows(supabase_service, "kw_companies", "ticker_id, full_name"),
+        fetch_rows(supabase_service, "kw_joined", "keyword, type"),
+    ),
+    version=lambda: fetch_version(supabase_service),
+)
+
 @callback(
      Output("header-dropdown", "data"),
-     Input('url', 'pathname'),
+     Input('header-dropdown', 'searchValue'),
+     State('header-dropdown', 'value'),
 )
-def dropdown_data(url):
-    kw_companies = (
-        supabase_service.table("kw_companies")
-        .select("ticker_id, full_name")
-        .execute()
-    )
-    kw_companies = kw_companies.data
-
-    kw_joined = (
-        supabase_service.table("kw_joined")
-        .select("keyword, type")
-        .execute()
-    )
-    kw_joined = kw_joined.data
-
-    dList = []
-    for company_dict in kw_companies:
-        label = f"Company: {company_dict['full_name']} ({company_dict['ticker_id']})"
-        value = f"/company?company={company_dict['ticker_id']}#query"
-        dList.append({'value':value, 'label':label})
-
-    for kw_dict in kw_joined:
-        label = f"Trend: {kw_dict['keyword']} ({kw_dict['type']})"
-        value = f"/trend?trend={kw_dict['keyword']}&source={kw_dict['type']}#query"
-        dList.append({'value':value, 'label':label})
-    dList = sorted(dList, key=lambda x: x['label'])
+def dropdown_data(search_value, value):
+    # typeahead: only the top fuzzy matches for what has been typed go to the browser
+    dList = search_index.search(search_value)
+    selected = search_index.get(value) if value else None
+    if selected and all(option['value'] != value for option in dList):
+        dList.append({'value': selected['value'], 'label': selected['label']})  # keep the selection's label
     return dList
 
 @callback(
@@ -1,2 +1,5 @@
 bind = "0.0.0.0:8080"
-workers = 2
\ No newline at end of file
+workers = 2
+# threaded workers: callbacks waiting on the analytics process pool (utils/compute.py) don't block other requests
+worker_class = "gthread"
+threads = 4
@@ -0,0 +1,90 @@
+"""
+Price history backfill for every ticker in kw_companies.
+
+The trend page's correlation and lead/lag figures (utils.relations) are computed from the local price store only, so
+every related ticker needs its history there, not just the ones visitors overlay. This job brings each ticker's
+history in the store up to date through the provider layer (utils.price_fetch.fetch_price_histories): yfinance
+tickers in batched downloads, EODHD tickers in a capped fan-out, each hedged against the other provider. Only what
+the store is missing goes upstream, so after the first run it mostly fetches the tails of yfinance tickers (EODHD
+ones are kept current by jobs/refresh_eod.py, which also seeds EODHD tickers it finds without history).
+
+Run from the repo root, after jobs.refresh_eod:
+    python -m jobs.backfill_prices [--years N] [--chunk-size N]
+"""
+import argparse
+import time
+from datetime import date, timedelta
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from supabase import create_client
+from supabase_client import SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY
+from utils.price_fetch import fetch_price_histories
+
+BACKFILL_YEARS = 5  # history kept for a ticker never fetched; trend pages ask for earlier bars on demand
+
+
+def fetch_stocks(client, page_size=1000):
+    """Every kw_companies ticker as [(source, symbol), ...], symbols as the trend page builds them."""
+    stocks, start = [], 0
+    while True:
+        rows = (
+            client.table("kw_companies")
+            .select("ticker, code, source")
+            .range(start, start + page_size - 1)
+            .execute()
+            .data
+        )
+        stocks += [(row['source'], f"{row['ticker']}.{row['code']}") for row in rows]
+        if len(rows) < page_size:
+            return stocks
+        start += page_size
+
+
+def backfill(stocks, start_date=None, end_date=None, chunk_size=200, fetch=fetch_price_histories):
+    """
+    Bring every ticker's daily history in the local price store up to date.
+
+    Args:
+        stocks (list[(str, str)]): (kw_companies source, symbol) pairs, e.g. ("EODHD", "AAPL.US").
+        start_date (str): 'YYYY-MM-DD' of the first bar wanted, BACKFILL_YEARS back by default.
+        end_date (str): 'YYYY-MM-DD' of the last bar wanted, today by default.
+        chunk_size (int): tickers fetched (and held in memory) at a time.
+        fetch (callable): fetch(jobs) -> {key: frame or Exception}, like fetch_price_histories.
+
+    Returns:
+        dict: ticker count, the tickers that failed with their error and run time.
+    """
+    started = time.perf_counter()
+    end_date = end_date or date.today().isoformat()
+    start_date = start_date or (date.today() - timedelta(days=365 * BACKFILL_YEARS)).isoformat()
+    stocks = sorted(set(stocks))
+    stats = {"tickers": len(stocks), "failed": []}
+
+    for i in range(0, len(stocks), chunk_size):
+        chunk = stocks[i:i + chunk_size]
+        histories = fetch({(source, symbol): (source, symbol, start_date, end_date) for source, symbol in chunk})
+        stats["failed"] += [(symbol, repr(history)) for (_, symbol), history in histories.items()
+                            if isinstance(history, Exception)]
+
+    stats["seconds"] = time.perf_counter() - started
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill the price history of every kw_companies ticker.")
+    parser.add_argument("--years", type=int, default=BACKFILL_YEARS, help="history wanted for new tickers")
+    parser.add_argument("--chunk-size", type=int, default=200, help="tickers fetched at a time")
+    args = parser.parse_args()
+
+    client = create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
+    start_date = (date.today() - timedelta(days=365 * args.years)).isoformat()
+    stats = backfill(fetch_stocks(client), start_date=start_date, chunk_size=args.chunk_size)
+    for symbol, error in stats["failed"]:
+        print(f"failed: {symbol}: {error}")
+    print(f"{stats['tickers']} tickers in {stats['seconds']:.1f}s, {len(stats['failed'])} failed")
+
+
+if __name__ == "__main__":
+    main()
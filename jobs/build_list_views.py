@@ -0,0 +1,67 @@
+"""
+Summary store for the discover pages' list views.
+
+Pulls only the kw_joined and kw_companies columns the discover cards and rows render, downsamples every card chart
+and sparkline once, and writes the result to the local summary store (utils.list_views.LIST_VIEW_PATH) that
+generate_cards and generate_groups read. Run it right after every kw_joined / kw_companies update and on a schedule
+shorter than LIST_VIEW_MAX_AGE (an hour by default), e.g. from cron; the pages fall back to a live query whenever the
+store is older than that.
+
+Run from the repo root:
+    python -m jobs.build_list_views [--output PATH]
+"""
+import argparse
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from supabase import create_client
+from supabase_client import SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY
+from utils.list_views import (LIST_VIEW_PATH, TREND_LIST_COLUMNS, COMPANY_LIST_COLUMNS, TREND_COLUMNS, trend_cards,
+                              company_rows, write_list_views)
+
+
+def fetch_pages(client, table, columns, page_size=1000):
+    """Yield every row of `table` (only `columns`), one page (list of rows) at a time."""
+    start = 0
+    while True:
+        rows = client.table(table).select(columns).range(start, start + page_size - 1).execute().data
+        yield rows
+        if len(rows) < page_size:
+            return
+        start += page_size
+
+
+def build(client, output=LIST_VIEW_PATH, page_size=1000):
+    """
+    Fetch, reduce and write both list views.
+
+    Returns:
+        dict: row counts and run time.
+    """
+    started = time.perf_counter()
+    trend_columns = ", ".join([TREND_LIST_COLUMNS, *TREND_COLUMNS.values(), "trend_projected"])
+    # reduced a page at a time so the full trend strings of the whole universe are never held at once
+    cards = [card for page in fetch_pages(client, "kw_joined", trend_columns, page_size)
+             for card in trend_cards(page)]
+    companies = [row for page in fetch_pages(client, "kw_companies", COMPANY_LIST_COLUMNS, page_size)
+                 for row in company_rows(page)]
+
+    write_list_views(cards, companies, path=output)
+    return {"cards": len(cards), "companies": len(companies), "seconds": time.perf_counter() - started}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the discover pages' list-view summary store.")
+    parser.add_argument("--output", default=LIST_VIEW_PATH, help="summary store path")
+    parser.add_argument("--page-size", type=int, default=1000, help="rows fetched per request")
+    args = parser.parse_args()
+
+    client = create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
+    stats = build(client, output=args.output, page_size=args.page_size)
+    print(f"{stats['cards']} trend cards and {stats['companies']} company rows in {stats['seconds']:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
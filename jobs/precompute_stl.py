@@ -0,0 +1,123 @@
+"""
+Offline STL precomputation for the whole kw_joined universe.
+
+Pulls every kw_joined row, decomposes the Long Term (period 3) and Short Term (period 7) series across a process
+pool and writes the results to the columnar store the trend page reads (utils.stl.STL_STORE_PATH).
+Entries whose trend string hash matches the existing store are reused, so weekly refreshes only recompute what
+moved.
+
+Run from the repo root:
+    python -m jobs.precompute_stl [--workers N] [--output PATH]
+"""
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from supabase import create_client
+from supabase_client import SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY
+from utils.helpers import parse_trend
+from utils.stl import (STL_PERIODS, STL_STORE_PATH, STLStore, compute_stl, hash_trend, stl_input, store_key,
+                       write_stl_store)
+
+
+def fetch_kw_joined(client, page_size=1000):
+    """Yield every kw_joined row (only the columns STL needs), one page at a time."""
+    start = 0
+    while True:
+        rows = (
+            client.table("kw_joined")
+            .select("keyword, type, trend, trend_st, trend_projected")
+            .range(start, start + page_size - 1)
+            .execute()
+            .data
+        )
+        yield from rows
+        if len(rows) < page_size:
+            return
+        start += page_size
+
+
+def _decompose(task):
+    key, data_hash, data_str, stl_period = task
+    try:
+        return key, data_hash, compute_stl(*parse_trend(data_str), stl_period), None
+    except Exception as e:
+        return key, data_hash, None, repr(e)
+
+
+def precompute(rows, output=STL_STORE_PATH, workers=None, chunksize=8):
+    """
+    Decompose every row for both periods and write the columnar store.
+
+    Args:
+        rows (iterable[dict]): kw_joined rows.
+        output (str): store path.
+        workers (int): process pool size (defaults to the CPU count).
+        chunksize (int): tasks handed to a worker at a time.
+
+    Returns:
+        dict: counts and throughput for the run.
+    """
+    started = time.perf_counter()
+    existing = {key: (data_hash, components) for key, data_hash, components in STLStore(output).entries()}
+
+    entries, tasks, failed = [], [], []
+    n_rows = 0
+    for row in rows:
+        n_rows += 1
+        for period in STL_PERIODS:
+            key = store_key(row['keyword'], row['type'], period)
+            try:
+                data_str, stl_period = stl_input(row, period)
+            except (KeyError, TypeError) as e:
+                failed.append((key, repr(e)))
+                continue
+
+            data_hash = hash_trend(data_str)
+            if key in existing and existing[key][0] == data_hash:
+                entries.append((key, data_hash, existing[key][1]))
+            else:
+                tasks.append((key, data_hash, data_str, stl_period))
+
+    reused = len(entries)
+    if tasks:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for key, data_hash, components, error in pool.map(_decompose, tasks, chunksize=chunksize):
+                if error is None:
+                    entries.append((key, data_hash, components))
+                else:
+                    failed.append((key, error))
+
+    write_stl_store(output, entries)
+    elapsed = time.perf_counter() - started
+    return {
+        "rows": n_rows,
+        "computed": len(entries) - reused,
+        "reused": reused,
+        "failed": failed,
+        "seconds": elapsed,
+        "rows_per_second": n_rows / elapsed if elapsed > 0 else float("inf"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute STL decompositions for every kw_joined row.")
+    parser.add_argument("--workers", type=int, default=None, help="process pool size (default: CPU count)")
+    parser.add_argument("--output", default=STL_STORE_PATH, help="columnar store path")
+    parser.add_argument("--page-size", type=int, default=1000, help="kw_joined rows fetched per request")
+    args = parser.parse_args()
+
+    client = create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
+    stats = precompute(fetch_kw_joined(client, args.page_size), output=args.output, workers=args.workers)
+
+    for key, error in stats["failed"]:
+        print(f"failed: {key.replace(chr(31), ' / ')}: {error}")
+    print(f"{stats['rows']} rows in {stats['seconds']:.1f}s ({stats['rows_per_second']:.1f} rows/s): "
+          f"{stats['computed']} computed, {stats['reused']} unchanged, {len(stats['failed'])} failed")
+
+
+if __name__ == "__main__":
+    main()
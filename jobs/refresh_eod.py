@@ -0,0 +1,169 @@
+"""
+Nightly end-of-day refresh for every EODHD ticker in kw_companies.
+
+Groups the ticker_ids by exchange code, pulls one bulk last-day response per exchange and appends the bars to the
+local price store (utils.price_cache), so page views serve daily data without a live historical call. Run it after
+the last exchange closes: a stored history that reaches the last trading day counts as current. Tickers the bulk bars
+can't extend (no history stored yet, or a gap) get their history backfilled (jobs.backfill_prices), so every ticker
+is covered from then on.
+
+Responses can be recorded and replayed, which is how the refresher is exercised without the EODHD API:
+    python -m jobs.refresh_eod --record DIR     # live pull, every response saved as DIR/<EXCHANGE>.json
+    python -m jobs.refresh_eod --replay DIR     # same run against the recorded responses
+
+Run from the repo root:
+    python -m jobs.refresh_eod [--date YYYY-MM-DD] [--record DIR | --replay DIR] [--no-backfill]
+"""
+import os
+import json
+import argparse
+import time
+from collections import defaultdict
+import pandas as pd
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from supabase import create_client
+from supabase_client import SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY
+from utils.EODHD_functions import get_bulk_last_day, EODHDError
+from utils.price_cache import append_daily_bars, PRICE_COLUMNS
+from jobs.backfill_prices import backfill
+
+
+def fetch_eodhd_ticker_ids(client, page_size=1000):
+    """Every EODHD-sourced ticker_id in kw_companies, as [(ticker_id, exchange code), ...]."""
+    ticker_ids, start = [], 0
+    while True:
+        rows = (
+            client.table("kw_companies")
+            .select("ticker_id, code, source")
+            .eq("source", "EODHD")
+            .range(start, start + page_size - 1)
+            .execute()
+            .data
+        )
+        ticker_ids += [(row['ticker_id'], row['code']) for row in rows]
+        if len(rows) < page_size:
+            return ticker_ids
+        start += page_size
+
+
+def group_by_exchange(ticker_ids):
+    """{exchange code: set of ticker_ids}"""
+    groups = defaultdict(set)
+    for ticker_id, code in ticker_ids:
+        groups[code].add(ticker_id)
+    return dict(groups)
+
+
+# ---------------------------------------- recorded responses for offline runs ----------------------------------------
+class RecordedBulk:
+    """
+    Stand-in for get_bulk_last_day that serves <dir>/<EXCHANGE>.json files saved by RecordingBulk.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def __call__(self, exchange_code, date=None):
+        path = os.path.join(self.directory, f"{exchange_code}.json")
+        try:
+            with open(path) as f:
+                return pd.DataFrame.from_dict(json.load(f))
+        except OSError as e:
+            raise EODHDError(f"no recorded response for {exchange_code}: {e}") from e
+
+
+class RecordingBulk:
+    """Wraps a bulk fetch and saves every response as <dir>/<EXCHANGE>.json for RecordedBulk."""
+
+    def __init__(self, directory, fetch=get_bulk_last_day):
+        self.directory = directory
+        self.fetch = fetch
+
+    def __call__(self, exchange_code, date=None):
+        df = self.fetch(exchange_code, date=date)
+        os.makedirs(self.directory, exist_ok=True)
+        df.to_json(os.path.join(self.directory, f"{exchange_code}.json"), orient="records")
+        return df
+
+
+# ----------------------------------------------------- refresh ------------------------------------------------------
+def refresh(ticker_ids, fetch_bulk=get_bulk_last_day, bar_date=None):
+    """
+    Pull one bulk last-day response per exchange and append the bars of our tickers to the price store.
+
+    Args:
+        ticker_ids (list[(str, str)]): (ticker_id, exchange code) pairs, e.g. ("AAPL.US", "US").
+        fetch_bulk (callable): fetch_bulk(exchange_code, date=None) -> DataFrame shaped like get_bulk_last_day.
+        bar_date (str): 'YYYY-MM-DD' to pull a specific day instead of the last trading day.
+
+    Returns:
+        dict: per-run counts, the exchanges that failed, tickers missing from their exchange's response and tickers
+        whose coverage the bars couldn't extend ('behind').
+    """
+    started = time.perf_counter()
+    stats = {"exchanges": 0, "stored": 0, "extended": 0, "failed": [], "missing": [], "behind": []}
+
+    for exchange, wanted in group_by_exchange(ticker_ids).items():
+        try:
+            bulk = fetch_bulk(exchange, date=bar_date)
+        except EODHDError as e:
+            stats["failed"].append((exchange, repr(e)))
+            continue
+        stats["exchanges"] += 1
+        if len(bulk) == 0:
+            stats["missing"] += sorted(wanted)
+            continue
+
+        bulk = bulk.assign(ticker=bulk["code"].astype(str) + "." + exchange)
+        bars = bulk[bulk["ticker"].isin(wanted)]
+        bars = bars[["ticker", "date", *[col for col in PRICE_COLUMNS if col in bars.columns]]]
+        # the session the endpoint actually returned, which is the previous one when run before today's close
+        session = pd.to_datetime(bulk["date"]).max().strftime("%Y-%m-%d")
+        counts = append_daily_bars(bars, as_of=session)
+        stats["stored"] += counts["stored"]
+        stats["extended"] += counts["extended"]
+        stats["behind"] += counts["behind"]
+        stats["missing"] += sorted(wanted - set(bars["ticker"]))
+
+    stats["seconds"] = time.perf_counter() - started
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Append the latest EODHD bulk end-of-day bars to the price store.")
+    parser.add_argument("--date", default=None, help="pull this day (YYYY-MM-DD) instead of the last trading day")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--record", metavar="DIR", help="save every bulk response to DIR")
+    group.add_argument("--replay", metavar="DIR", help="serve bulk responses from DIR instead of EODHD")
+    parser.add_argument("--no-backfill", action="store_true", help="don't fetch history for tickers left behind")
+    args = parser.parse_args()
+
+    client = create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
+    if args.replay:
+        fetch_bulk = RecordedBulk(args.replay)
+    elif args.record:
+        fetch_bulk = RecordingBulk(args.record)
+    else:
+        fetch_bulk = get_bulk_last_day
+
+    stats = refresh(fetch_eodhd_ticker_ids(client), fetch_bulk=fetch_bulk, bar_date=args.date)
+    for exchange, error in stats["failed"]:
+        print(f"failed: {exchange}: {error}")
+    if stats["missing"]:
+        print(f"not in bulk response: {', '.join(stats['missing'])}")
+    print(f"{stats['exchanges']} exchanges in {stats['seconds']:.1f}s: {stats['stored']} tickers stored, "
+          f"{stats['extended']} coverage extended, {len(stats['failed'])} exchanges failed")
+
+    if stats["behind"] and not args.no_backfill and not args.replay:
+        backfilled = backfill([("EODHD", ticker_id) for ticker_id in stats["behind"]])
+        for symbol, error in backfilled["failed"]:
+            print(f"backfill failed: {symbol}: {error}")
+        print(f"{backfilled['tickers']} tickers backfilled in {backfilled['seconds']:.1f}s, "
+              f"{len(backfilled['failed'])} failed")
+
+
+if __name__ == "__main__":
+    main()
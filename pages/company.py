@@ -4,14 +4,18 @@ import pandas as pd
 import dash_mantine_components as dmc
 from supabase_client import supabase_anon, supabase_service
 from utils.helpers import get_first_last_multi_trends
-import yfinance as yf
-from utils.EODHD_functions import get_historical_stock_data
+from utils.price_cache import PRICE_COLUMNS, PRICE_FETCH_ERRORS
+from utils.price_fetch import fetch_price_history
 from plotly.subplots import make_subplots
 import plotly.graph_objects as go
 from utils.helpers import (parse_data_for_charts, round_sig, adjust_to_nearest_dates, get_corr_companies,
-                           merge_dict_lists_companies, convert_to_last_day_of_month)
+                           merge_dict_lists_companies, convert_to_last_day_of_month, get_lead_lag_companies,
+                           lag_profile_chart_data, get_rolling_corr, rolling_corr_chart_data, get_trend_series,
+                           to_day_array)
 from datetime import datetime
 from dash_iconify import DashIconify
+from dash.exceptions import PreventUpdate
+from utils.compute import run_task, page_tag, ComputeError, ComputeCancelled
 
 
 dash.register_page(__name__, path='/company', name='Landing Page', title='tab title',
@@ -39,9 +43,27 @@ layout = dmc.Box([
     dmc.Group(id='company-badge', style={'margin-bottom': '30px'},),
     dmc.Group(children=[trend_dropdown], style={'margin-bottom': '20px'}),
     dcc.Graph(id='main-chart-company'),
+    dmc.Box(id='rolling-corr-container-company'),
     dmc.Divider(variant="solid", style={'margin-bottom': '20px', 'margin-top': '20px'}),
     dmc.Paper(id='company-info', withBorder=True, style={'margin-bottom': '20px'}),
     dmc.Paper(id='relation-table-companies', style={'margin-bottom': '20px'}),
+    dmc.Stack(children=[
+        dmc.Group(children=[
+            dmc.Title("Lead/Lag", order=3),
+            dmc.HoverCard(
+                shadow='md',
+                width=250,
+                children=[
+                    dmc.HoverCardTarget(DashIconify(icon="material-symbols:info-outline", width=20)),
+                    dmc.HoverCardDropdown(
+                        "Correlation between each trend and the stock price when the trend is shifted by a number "
+                        "of weeks. A peak at a positive lag means the trend tends to lead the stock price."
+                    ),
+                ]
+            ),
+        ], gap='sm'),
+        dmc.Box(id='lag-chart-company'),
+    ], gap='xs', style={'margin-bottom': '20px'}),
     dmc.Divider(variant="solid", style={'margin-bottom': '20px', 'margin-top': '20px'}),
     dmc.Stack(children=[
         dmc.Text("Related Trends", fw=700, size='sm'),
@@ -66,17 +88,13 @@ def get_kw_data(metadata):
         .execute()
     )
     data = response.data[0]
-    start_date, end_date = get_first_last_multi_trends(data['keywords'])
-    if data['source'] == "EODHD":
-        price_data = get_historical_stock_data(data['ticker_id'],
-                                               from_date=start_date, to_date=datetime.today().strftime("%Y-%m-%d"))
-        price_data["date"] = pd.to_datetime(price_data["date"])
-    else:
-        price_data = yf.download(data['ticker_id'],
-                                 start=start_date, end=end_date)
-        price_data = price_data.droplevel('Ticker', axis=1)
-        price_data = price_data.reset_index()
-        price_data.columns = price_data.columns.str.lower()
+    start_date, _ = get_first_last_multi_trends(data['keywords'])
+    try:
+        price_data = fetch_price_history(data['source'], data['ticker_id'],
+                                         start_date, datetime.today().strftime("%Y-%m-%d"))
+    except PRICE_FETCH_ERRORS as e:
+        print(f"price fetch failed for {data['ticker_id']}: {e}")
+        price_data = pd.DataFrame(columns=['date', *PRICE_COLUMNS])
 
     price_dict = price_data.to_dict(orient="list")
     return data, price_dict
@@ -179,6 +197,41 @@ def get_main_chart_company(data, price_data, trend, theme):
 
     return fig
 
+# ------------------------------ Rolling correlation under the main chart (selected trend) ----------------------------
+@callback(
+    Output("rolling-corr-container-company", "children"),
+    [Input("company-data-store", "data"),
+     Input("price-data-store2", "data"),
+     Input("trend-select", "value"),]
+)
+def gen_rolling_corr_company(data, price_data, trend):
+    if not trend:
+        return None
+
+    dtype = 'Tiktok' if '#' in trend else 'Google Search'
+    trend_c = trend.replace("#", "")
+    trendData = next((d for d in data['keywords'] if d.get("keyword") == trend_c and d.get("type") == dtype), None)
+    if trendData is None:
+        return None
+
+    price_series = (to_day_array(price_data['date']), pd.to_numeric(pd.Series(price_data['close'])).to_numpy())
+    grid, r = get_rolling_corr(get_trend_series(trendData['trend']), price_series,
+                               key=(trend_c, dtype, 'Long Term', data['ticker_id']))
+
+    return dmc.Stack(children=[
+        dmc.Text(f"3-Month Rolling Correlation: {trend} vs {data['ticker_id']}", fw=700, size='sm'),
+        dmc.LineChart(
+            h=180,
+            dataKey="date",
+            data=rolling_corr_chart_data(grid, r),
+            series=[{"name": "correlation", "color": "orange.6"}],
+            yAxisProps={"domain": [-1, 1]},
+            referenceLines=[{"y": 0, "color": "gray.6"}],
+            withDots=False,
+        ),
+    ], gap='xs', style={'margin-top': '20px'})
+
+
 # ------------------------------------- Sets up what's in the trend-select dropdown ------------------------------------
 @callback(
     Output("trend-select", "data"),
@@ -230,14 +283,23 @@ def gen_stock_btns(data):
 
 
 @callback(
-    Output("relation-table-companies", "children"),
+    [Output("relation-table-companies", "children"),
+     Output("lag-chart-company", "children"),],
     [Input("company-data-store", "data"),
      Input("price-data-store2", "data"),]
 )
 def create_relation_table(data, price_data):
     data_tbl = data['keywords']
-    corr = get_corr_companies(data, price_data)
+    tag = page_tag('/company')
+    try:
+        corr = run_task(get_corr_companies, data, price_data, tag=tag)
+        lead_lag = run_task(get_lead_lag_companies, data, price_data, tag=tag)
+    except ComputeCancelled:
+        raise PreventUpdate
+    except ComputeError:
+        corr, lead_lag = [], []
     data_tbl = merge_dict_lists_companies(data_tbl, corr)
+    data_tbl = merge_dict_lists_companies(data_tbl, lead_lag)
     rows = [
         dmc.TableTr(
             [
@@ -245,6 +307,9 @@ def create_relation_table(data, price_data):
                 dmc.TableTd(element["type"]),
                 dmc.TableTd(element["impact"]),
                 dmc.TableTd(element["direction"]),
+                dmc.TableTd(element.get("Long-term Correlation")),
+                dmc.TableTd(element.get("Short-term Correlation")),
+                dmc.TableTd(element.get("Best Lag (weeks)")),
                 dmc.TableTd(dcc.Markdown(element["relation"])),
             ]
         )
@@ -258,6 +323,9 @@ def create_relation_table(data, price_data):
                 dmc.TableTh("Source"),
                 dmc.TableTh("Relation"),
                 dmc.TableTh("Direction"),
+                dmc.TableTh("Long-term Correlation"),
+                dmc.TableTh("Short-term Correlation"),
+                dmc.TableTh("Best Lag (weeks)"),
                 dmc.TableTh("Relationship with Trend"),
             ]
         )
@@ -270,4 +338,18 @@ def create_relation_table(data, price_data):
                     withTableBorder=True,
                     withColumnBorders=True,
                     )
-    return tbl
\ No newline at end of file
+
+    # ------------------------------------------ lead/lag profile chart -----------------------------------------------
+    names = [f"#{item['keyword']}" if item['type'] == 'Tiktok' else item['keyword'] for item in lead_lag]
+    lag_data, lag_series = lag_profile_chart_data(lead_lag, names)
+    lag_chart = dmc.LineChart(
+        h=220,
+        dataKey="lag",
+        data=lag_data,
+        series=lag_series,
+        xAxisLabel="Weeks the trend leads the stock price",
+        withLegend=True,
+        withDots=False,
+        connectNulls=True,  # monthly trends only have a point every ~4 weeks
+    )
+    return tbl, lag_chart
\ No newline at end of file
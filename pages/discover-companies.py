@@ -1,20 +1,12 @@
 from dash import dcc, html, Input, Output, callback, register_page, State
 import pandas as pd
 import dash_mantine_components as dmc
-from datetime import datetime, timedelta
 from supabase_client import supabase_anon, supabase_service
-import re
 from dash_iconify import DashIconify
+from utils.entitlements import get_subscription_status
+from utils.list_views import COMPANY_LIST_COLUMNS, COMPANY_SORTS, company_rows, query_company_rows
 
 
-def parse_vols_for_sparkline(s: str) -> list[int]:
-    """
-    Parse 'MM/DD/YYYY: Volume' pairs from a string and return volumes as ints.
-    Handles commas in numbers and extra quotes/whitespace.
-    """
-    s = s.strip().strip('"').strip("'")
-    return [int(v.replace(",", "")) for v in re.findall(r":\s*([+-]?\d[\d,]*)", s)]
-
 # ----------------------------------------------- Generate Rows -------------------------------------------------------
 def create_rows(data, overlay_style, free_limit):
     rows = []
@@ -36,8 +28,8 @@ def create_rows(data, overlay_style, free_limit):
         # ---------------------------------------- Second Column -------------------------------------------------------
         sparklineRows = []
         for keywordData in dataRow['keywords']:
-            trend = parse_vols_for_sparkline(keywordData['trend'])
-            sparkline = dmc.Sparkline(w=300, h=100, data=trend, color='blue')
+            # pre-downsampled in utils.list_views
+            sparkline = dmc.Sparkline(w=300, h=100, data=keywordData['sparkline'], color='blue')
 
             if keywordData['type'] == 'Tiktok':
                 source_icon = DashIconify(icon="mage:tiktok-circle", width=30)
@@ -199,17 +191,8 @@ layout = dmc.Box([
 )
 def generate_groups(user_data, page, sort_filter, country_filter):
     # ------------------------ if the user has paid no paywall, otherwise paywall -------------------------------------
-    if user_data != None:
-        response = (
-            supabase_service.table("user_profiles")
-            .select("subscription_status")
-            .eq("id", user_data['id'])
-            .single()
-            .execute()
-        )
-        sub_status = response.data['subscription_status']
-    else:
-        sub_status = None
+    # cached per user (utils.entitlements) and invalidated by the Stripe webhook
+    sub_status = get_subscription_status(user_data['id']) if user_data is not None else None
 
     if sub_status == 'active':
         overlay_style = {
@@ -246,27 +229,21 @@ def generate_groups(user_data, page, sort_filter, country_filter):
     start = limit * (page - 1) + 1
     end = min(total, limit * page)
 
-    query = supabase_service.table("kw_companies").select("*")
-
-    # --------------------------------------- apply filters before query ---------------------------------------
-    if country_filter:
-        query = query.ilike("country", f"%{country_filter}%")
-
-    # --------------------------------------- apply sorting before query ---------------------------------------
-    if sort_filter == "YoY Growth Ascending":
-        query = query.order("avg_yoy", desc=False)
-    elif sort_filter == "YoY Growth Descending":
-        query = query.order("avg_yoy", desc=True)
-    elif sort_filter == "Volume/Views Ascending":
-        query = query.order("avg_volume", desc=False)
-    elif sort_filter == "Volume/Views Descending":
-        query = query.order("avg_volume", desc=True)
-    elif sort_filter == "Alphabetically Ascending":
-        query = query.order("ticker", desc=False)
-    elif sort_filter == "Alphabetically Descending":
-        query = query.order("ticker", desc=True)
-
-    # --------------------------------------- fetch data ---------------------------------------
-    data = query.range(start, end).execute().data
+    # ------------------------- lean list rows: summary store first, else the same projection live ---------------------
+    data = query_company_rows(country_filter, sort_filter, start, end)
+    if data is None:
+        query = supabase_service.table("kw_companies").select(COMPANY_LIST_COLUMNS)
+
+        # --------------------------------------- apply filters before query ---------------------------------------
+        if country_filter:
+            query = query.ilike("country", f"%{country_filter}%")
+
+        # --------------------------------------- apply sorting before query ---------------------------------------
+        if sort_filter in COMPANY_SORTS:
+            column, desc = COMPANY_SORTS[sort_filter]
+            query = query.order(column, desc=desc)
+
+        # --------------------------------------- fetch data ---------------------------------------
+        data = company_rows(query.range(start, end).execute().data)
 
     return create_rows(data, overlay_style, free_limit)
@@ -1,20 +1,23 @@
 from dash import dcc, html, Input, Output, callback, register_page, State, ctx
 import pandas as pd
 import dash_mantine_components as dmc
-from datetime import datetime, timedelta
 from supabase_client import supabase_anon, supabase_service
 from dash_iconify import DashIconify
 from utils.helpers import format_number, format_growth
+from utils.entitlements import get_subscription_status
+from utils.list_views import (TREND_COLUMNS, TREND_LIST_COLUMNS, TREND_SORTS, card_for_period, query_trend_cards,
+                              series_arrays, trend_cards)
 
 # ---------------------------------------------- Functions ------------------------------------------------------------
-# ---------------------- Prepare timeseries string to list of dictionaries for dmc.Charts -----------------------------
-def parse_volume_data(data_str, source, projected=False, monthly=True):
+# ---------------------- Prepare timeseries arrays to list of dictionaries for dmc.Charts -----------------------------
+def parse_volume_data(series, source, projected=False, monthly=True):
     """
-    Convert a string of 'MM/DD/YYYY: volume' pairs into a list of dictionaries
+    Convert a parsed (dates, volumes) trend series into a list of dictionaries
     with formatted date and volume.
 
     Args:
-        data_str (str): String with entries like "MM/DD/YYYY: volume, ..."
+        series (tuple): (dates, volumes) arrays as returned by utils.helpers.parse_trends or
+            utils.list_views.series_arrays
         source (str): Either "Google Search" or "Tiktok"
         projected (bool): If True, append " (estimated)" to label
         monthly (bool): monthly will give Aug 2025, non monthly will givem week of 01/01/2025 or 01/01/2025
@@ -29,30 +32,29 @@ def parse_volume_data(data_str, source, projected=False, monthly=True):
     else:
         label = "volume" + prj
 
-    pairs = [item.strip() for item in data_str.split(",") if item.strip()]
-    result = []
+    dates, volumes = series
+    dates = pd.DatetimeIndex(dates)
 
-    for pair in pairs:
-        date_str, volume_str = pair.split(": ")
-        date_obj = datetime.strptime(date_str, "%m/%d/%Y")
-
-        # Choose format based on period
-        if monthly:
-            formatted_date = date_obj.strftime("%b %Y")   # "Aug 2025"
-        else:
-            if source == "Tiktok":
-                formatted_date = f"week of {date_obj.strftime('%m/%d/%Y')}"  # "week of 08/01/2020"
-            else:
-                formatted_date = date_obj.strftime("%m/%d/%Y")  # "08/01/2020"
-
-        result.append({"date": formatted_date, label: int(volume_str)})
+    # Choose format based on period
+    if monthly:
+        formatted_dates = dates.strftime("%b %Y")   # "Aug 2025"
+    elif source == "Tiktok":
+        formatted_dates = dates.strftime("week of %m/%d/%Y")  # "week of 08/01/2020"
+    else:
+        formatted_dates = dates.strftime("%m/%d/%Y")  # "08/01/2020"
 
-    return result
+    return [{"date": d, label: v} for d, v in zip(formatted_dates, volumes.tolist())]
 
 
 # ----------------------------------------------- Generate Cards ------------------------------------------------------
 def create_cards(data, overlay_style, period, free_limit):
     cards=[]
+    # ------------------------------- every card's series (and projection) arrive downsampled ------------------------
+    trends = [series_arrays(d['series']) for d in data]
+    with_projection = any(d['projected'] for d in data) and period == "Long Term"
+    if with_projection:
+        projections = [series_arrays(d['projected']) for d in data]
+
     for i in range(len(data)):
         # ------------------------------------------- free content allowance ------------------------------------------
         if i < free_limit:
@@ -84,7 +86,7 @@ def create_cards(data, overlay_style, period, free_limit):
             monthly = False
 
         # ----------------------------------------- get actual trend ---------------------------------------------
-        search_vol = parse_volume_data(data[i]['trend'], data[i]['type'], projected=False, monthly=monthly)
+        search_vol = parse_volume_data(trends[i], data[i]['type'], projected=False, monthly=monthly)
 
         # ------------- adds views est to actual trend so that the actual trend and prj trend lines join up -----------
         if search_vol and period == "Long Term":
@@ -94,8 +96,8 @@ def create_cards(data, overlay_style, period, free_limit):
                 search_vol[-1]["volume (estimated)"] = search_vol[-1]["volume"]
 
         # ------------------------------------- adds projected trend if long term -------------------------------------
-        if any('trend_projected' in d for d in data) and period == "Long Term":
-            search_vol = search_vol + parse_volume_data(data[i]['trend_projected'], data[i]['type'], projected=True,
+        if with_projection:
+            search_vol = search_vol + parse_volume_data(projections[i], data[i]['type'], projected=True,
                                                         monthly=monthly)
 
         # ------------------------------------- gets vol and growth for the card -------------------------------------
@@ -318,17 +320,8 @@ def get_page_metadata(search, hash):
 )
 def generate_cards(category_filter, source_filter, sort_filter, period_filter, user_data, page):
     # ------------------------ if the user has paid no paywall, otherwise paywall -------------------------------------
-    if user_data is not None:
-        response = (
-            supabase_service.table("user_profiles")
-            .select("subscription_status")
-            .eq("id", user_data["id"])
-            .single()
-            .execute()
-        )
-        sub_status = response.data["subscription_status"]
-    else:
-        sub_status = None
+    # cached per user (utils.entitlements) and invalidated by the Stripe webhook
+    sub_status = get_subscription_status(user_data["id"]) if user_data is not None else None
 
     if sub_status == "active":
         overlay_style = {"position": "absolute", "display": "none", "zIndex": 1}
@@ -360,38 +353,28 @@ def generate_cards(category_filter, source_filter, sort_filter, period_filter, u
     start = limit * (new_page - 1)
     end = min(total - 1, start + limit - 1)
 
-    # --------------------------------------- setup base query ---------------------------------------
-    if period_filter == "Short Term":
-        # Alias short-term trend as "trend", omit "trend_projected"
-        select_cols = "*,trend:trend_st"
-    else:
-        select_cols = "*"
-
-    query = supabase_service.table("kw_joined").select(select_cols)
-
-    # --------------------------------------- apply filters before query ---------------------------------------
-    if category_filter:
-        query = query.ilike("categories", f"%{category_filter.strip()}%")
-
-    if source_filter:
-        query = query.ilike("type", f"%{source_filter.strip()}%")
-
-    # --------------------------------------- apply sorting before query ---------------------------------------
-    if sort_filter == "YoY Growth Ascending":
-        query = query.order("yoy", desc=False)
-    elif sort_filter == "YoY Growth Descending":
-        query = query.order("yoy", desc=True)
-    elif sort_filter == "Volume/Views Ascending":
-        query = query.order("volume", desc=False)
-    elif sort_filter == "Volume/Views Descending":
-        query = query.order("volume", desc=True)
-    elif sort_filter == "Alphabetically Ascending":
-        query = query.order("keyword", desc=False)
-    elif sort_filter == "Alphabetically Descending":
-        query = query.order("keyword", desc=True)
-
-    # --------------------------------------- fetch data ---------------------------------------
-    data = query.range(start, end).execute().data
+    # ------------------------- lean list rows: summary store first, else the same projection live ---------------------
+    data = query_trend_cards(period_filter, category_filter, source_filter, sort_filter, start, end)
+    if data is None:
+        period = period_filter if period_filter in TREND_COLUMNS else "Long Term"
+        trend_cols = [TREND_COLUMNS[period]] + (["trend_projected"] if period == "Long Term" else [])
+        query = supabase_service.table("kw_joined").select(", ".join([TREND_LIST_COLUMNS, *trend_cols]))
+
+        # --------------------------------------- apply filters before query ---------------------------------------
+        if category_filter:
+            query = query.ilike("categories", f"%{category_filter.strip()}%")
+
+        if source_filter:
+            query = query.ilike("type", f"%{source_filter.strip()}%")
+
+        # --------------------------------------- apply sorting before query ---------------------------------------
+        if sort_filter in TREND_SORTS:
+            column, desc = TREND_SORTS[sort_filter]
+            query = query.order(column, desc=desc)
+
+        # --------------------------------------- fetch data ---------------------------------------
+        rows = query.range(start, end).execute().data
+        data = [card_for_period(card, period_filter) for card in trend_cards(rows, periods=(period,))]
 
     # ---------------------------------------------- create the card --------------------------------------------------
     if page == 1:
@@ -1,5 +1,7 @@
+import sqlite3
 import dash
-from dash import dcc, callback, Output, Input, html, State
+from dash import dcc, callback, Output, Input, html, State, ctx, no_update
+from dash.exceptions import PreventUpdate
 import pandas as pd
 import dash_mantine_components as dmc
 from supabase_client import supabase_anon, supabase_service
@@ -7,11 +9,16 @@ from dash_iconify import DashIconify
 from datetime import datetime
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-from utils.helpers import (format_number, format_growth, get_last_date, get_first_date, convert_date_format,
-                           parse_data_for_charts, convert_to_last_day_of_month, round_sig, get_corr, merge_dict_lists)
-from utils.EODHD_functions import get_historical_stock_data
-import yfinance as yf
-from statsmodels.tsa.seasonal import STL
+from utils.helpers import (format_number, format_growth, get_last_date,
+                           parse_data_for_charts, round_sig, merge_dict_lists,
+                           get_trend_series, lag_profile_chart_data,
+                           get_rolling_corr, rolling_corr_chart_data, to_day_array)
+from utils.price_cache import PRICE_FETCH_ERRORS
+from utils.price_fetch import fetch_price_history, price_store_entry
+from utils.relations import get_relations
+from utils.stl import get_stl, stl_input
+from utils.compute import page_tag, ComputeError, ComputeCancelled
+import numpy as np
 
 
 
@@ -63,6 +70,7 @@ layout = dmc.Box([
               style={'margin-bottom': '20px'}),
     dmc.Group(id='kw-details', gap='xl', justify='flex-start'),
     dcc.Graph(id='main-chart'),
+    dmc.Box(id='rolling-corr-container', style={'margin-bottom': '20px'}),
     dmc.Accordion(
         children=[
             dmc.AccordionItem(
@@ -146,10 +154,38 @@ layout = dmc.Box([
                 ],
                 value="momentum-accord",
             ),
+            dmc.AccordionItem(
+                [
+                    dmc.AccordionControl(
+                        dmc.Group(
+                            children = [
+                                dmc.Title("Lead/Lag", order=3),
+                                dmc.HoverCard(
+                                    shadow='md',
+                                    width=250,
+                                    children=[
+                                        dmc.HoverCardTarget(
+                                            DashIconify(icon="material-symbols:info-outline", width=20)
+                                        ),
+                                        dmc.HoverCardDropdown(
+                                            "Correlation between the trend and each stock price when the trend is "
+                                            "shifted by a number of weeks. A peak at a positive lag means the trend "
+                                            "tends to lead the stock price by that many weeks."
+                                        ),
+                                    ]
+                                ),
+                            ],
+                            gap='sm'
+                        ),
+                    ),
+                    dmc.AccordionPanel(id='lag-container'),
+                ],
+                value="lag-accord",
+            ),
         ],
         variant="separated",
         style={'margin-top': '20px', 'margin-bottom': '20px'},
-        value=["trend-accord","seasonality-accord", "momentum-accord"],
+        value=["trend-accord","seasonality-accord", "momentum-accord", "lag-accord"],
     ),
     dmc.Paper(id='kw-info', withBorder=True, style={'margin-bottom': '20px'}),
     dmc.Paper(id='relation-table', style={'margin-bottom': '20px'}),
@@ -319,11 +355,13 @@ def gen_main_chart(data, period_filter, ticker, price_data, theme):
     # -------------------------- Generates candle stick charts onto the figure if selected ----------------------------
     start_date = kw_trend_x[0]
 
-    if ticker:
-        stock_data = [d for d in price_data if d['ticker'] == ticker][0]
+    stock_data = next((d for d in price_data or [] if d['ticker'] == ticker), None) if ticker else None
+    if stock_data is not None:
         stock_data.pop('ticker')
         stock_data.pop('code')
-        df_price = pd.DataFrame(stock_data)
+        # overlay the price at the trend's resolution (daily / weekly / monthly closes)
+        levels = stock_data.pop('levels', {})
+        df_price = pd.DataFrame(levels.get(period, stock_data))
         df_price["date"] = pd.to_datetime(df_price["date"])
         df_price = df_price[df_price["date"] >= start_date]
         df_price = df_price.reset_index(drop=True)
@@ -376,41 +414,81 @@ def gen_main_chart(data, period_filter, ticker, price_data, theme):
     return fig, details
 
 
-# -------------------------------------- Gets stock price and stores it -----------------------------------------------
+# ------------------------------ Rolling correlation under the main chart (selected stock) ---------------------------
+@callback(
+    Output("rolling-corr-container", "children"),
+    [Input("kw-data-store", "data"),
+     Input("period-select-kw", "value"),
+     Input("data-select-kw", "value"),
+     Input("price-data-store", "data"),]
+)
+def gen_rolling_corr(data, period_filter, ticker, price_data):
+    stock_data = next((d for d in price_data or [] if d['ticker'] == ticker), None)
+    if not ticker or stock_data is None:
+        return None
+
+    trend = data['trend_st'] if period_filter == "Short Term" else data['trend']
+    price_series = (to_day_array(stock_data['date']), pd.to_numeric(pd.Series(stock_data['close'])).to_numpy())
+    grid, r = get_rolling_corr(get_trend_series(trend), price_series,
+                               key=(data['keyword'], data['type'], period_filter, ticker))
+
+    return dmc.Stack(children=[
+        dmc.Text(f"3-Month Rolling Correlation: {data['keyword']} vs {ticker}", fw=700, size='sm'),
+        dmc.LineChart(
+            h=180,
+            dataKey="date",
+            data=rolling_corr_chart_data(grid, r),
+            series=[{"name": "correlation", "color": "orange.6"}],
+            yAxisProps={"domain": [-1, 1]},
+            referenceLines=[{"y": 0, "color": "gray.6"}],
+            withDots=False,
+        ),
+    ], gap='xs')
+
+
+# ------------------------------ Gets the selected stock's price (on demand) and stores it ---------------------------
 @callback(
      Output("price-data-store", "data"),
     [Input("kw-data-store", "data"),
-     Input("stock-data-store", "data"),],
-    State("data-select-kw", "data"),
+     Input("stock-data-store", "data"),
+     Input("data-select-kw", "value"),],
+    State("price-data-store", "data"),
 )
-def get_price_data(data, sData, data_filter):
-    trend = data['trend'] + ', ' + data['trend_st']
-
-    start_date = convert_date_format(get_first_date(trend))
+def get_price_data(data, sData, ticker, price_store):
+    # only the ticker overlaid on the chart is downloaded; fetched tickers stay in the store so switching is instant.
+    # stock-data-store is an Input: it is filled after kw-data-store, so the persisted ticker of a reload is fetched
+    # as soon as its kw_companies row arrives
+    reset = "kw-data-store.data" in ctx.triggered_prop_ids
+    price_store = [] if reset else (price_store or [])
+    # entries without bars are failed fetches: selecting the ticker again retries them
+    if not ticker or ticker == 'Trendline' or any(d['ticker'] == ticker and d['date'] for d in price_store):
+        return price_store if reset else no_update
+
+    stock_data = next((d for d in sData or [] if d['ticker'] == ticker), None)
+    if stock_data is None:
+        return price_store if reset else no_update
+
+    trend_dates, _ = get_trend_series(data['trend'])
+    start_date = str(trend_dates[0])
     end_date = datetime.today().strftime("%Y-%m-%d")
-
-    final_data = []
-    for tag in data_filter:
-        ticker = tag['value']
-        if ticker != 'Trendline':
-            stock_data = [d for d in sData if d['ticker'] == ticker][0]
-
-            if stock_data['source'] == "EODHD":
-                price_data = get_historical_stock_data(f"{stock_data['ticker']}.{stock_data['code']}",
-                                                       from_date=start_date, to_date=end_date)
-                price_data["date"] = pd.to_datetime(price_data["date"])
-            else:
-                price_data = yf.download(f"{stock_data['ticker']}.{stock_data['code']}",
-                                         start=start_date, end=end_date)
-                price_data = price_data.droplevel('Ticker', axis=1)
-                price_data = price_data.reset_index()
-                price_data.columns = price_data.columns.str.lower()
-
-            data_dict = price_data.to_dict(orient="list")
-            data_dict['ticker'] = ticker
-            data_dict['code'] = stock_data['code']
-            final_data.append(data_dict)
-    return final_data
+    symbol = f"{stock_data['ticker']}.{stock_data['code']}"
+    levels = {}
+    try:
+        price_data, (provider, provider_symbol) = fetch_price_history(stock_data['source'], symbol, start_date,
+                                                                      end_date, served_by=True)
+    except PRICE_FETCH_ERRORS as e:
+        price_data = e
+    else:
+        # weekly / monthly bars were rolled up when the daily bars were stored: read them from the cache of the
+        # provider that served those, never upstream again; without them the chart overlays the daily closes
+        try:
+            levels = {level: provider.cached(provider_symbol, start_date, end_date, level)
+                      for level in ('weekly', 'monthly')}
+        except sqlite3.Error as e:
+            print(f"price levels unavailable for {ticker}: {e!r}")
+            levels = {}
+    return ([d for d in price_store if d['ticker'] != ticker]
+            + [price_store_entry(ticker, stock_data['code'], price_data, levels)])
 
 # ----------------------------------- Generates seasonality, trend ----------------------------------------------------
 @callback(
@@ -422,33 +500,17 @@ def get_price_data(data, sData, data_filter):
 )
 def gen_STL(data, period):
     # ------------------------------------------- Sets STL period -----------------------------------------------------
-    if period == 'Long Term':
-        data_str = data['trend'] + ', ' + data['trend_projected']
-        convert_to_last_day_of_month(data_str)
-        STL_period = 3  #quaterly
-    elif period == 'Short Term':
-        data_str = data['trend_st']
-        STL_period = 7  #weekly
-    else:
-        print(f"invalid period: {period}")
-
-    # -------------------------------- preps timeseries string to STL format (df)--------------------------------------
-    entries = [item.strip() for item in data_str.split(",")]
-    STL_data = [(datetime.strptime(date.strip(), "%m/%d/%Y"), int(value.strip())) for date, value in
-            (entry.split(":") for entry in entries)]
-    df = pd.DataFrame(STL_data, columns=["Date", "Volume"])
-    df.set_index("Date", inplace=True)
-    df = df.iloc[:-1]
-    stl = STL(df['Volume'], period=STL_period)
-    res = stl.fit()
-    stl_df = pd.DataFrame({
-        'Observed': res.observed,
-        'Trend': res.trend,
-        'Seasonal': res.seasonal,
-        'Residual': res.resid
-    }, index=df.index.date)
-    stl_df = stl_df.round(0).astype(int)
-    stl_df['Trend_Momentum'] = stl_df['Trend'].diff()
+    data_str, STL_period = stl_input(data, period)  # quarterly for Long Term, weekly for Short Term
+
+    # ------------------------------ STL components (from the shared on-disk cache if fresh) --------------------------
+    try:
+        stl = get_stl(data['keyword'], data['type'], period, data_str, STL_period, tag=page_tag('/trend'))
+    except ComputeCancelled:
+        raise PreventUpdate
+    except ComputeError:
+        busy = dmc.Text("This chart is taking longer than usual, please refresh in a moment.", c="dimmed", size="sm")
+        return busy, busy, busy
+    stl_dates = [str(d) for d in stl['date']]
 
     if data['type'] == "Tiktok":
         label = "views"
@@ -456,19 +518,9 @@ def gen_STL(data, period):
         label = "volume"
 
     # --------------------------------------------- creates dmc chart--------------------------------------------------
-    trend = [
-        {"date": idx, label: row["Trend"]}
-        for idx, row in stl_df.iterrows()
-    ]
-    seasonal = [
-        {"date": idx, label: row["Seasonal"]}
-        for idx, row in stl_df.iterrows()
-    ]
-
-    momentum = [
-        {"date": idx, label: row["Trend_Momentum"]}
-        for idx, row in stl_df.iterrows()
-    ]
+    trend = [{"date": d, label: v} for d, v in zip(stl_dates, stl['trend'].tolist())]
+    seasonal = [{"date": d, label: v} for d, v in zip(stl_dates, stl['seasonal'].tolist())]
+    momentum = [{"date": d, label: None if np.isnan(v) else v} for d, v in zip(stl_dates, stl['momentum'].tolist())]
 
     trend_chart = dmc.LineChart(
         h=180,
@@ -527,12 +579,25 @@ def gen_trend_info(data):
 
 
 @callback(
-    Output("relation-table", "children"),
-    Input("kw-data-store", "data"),
+    [Output("relation-table", "children"),
+     Output("lag-container", "children"),],
+    [Input("kw-data-store", "data"),
+     Input("stock-data-store", "data"),
+     Input("price-data-store", "data"),]
 )
-def create_relation_table(data):
+def create_relation_table(data, sData, price_data):
+    # price-data-store is only a trigger: a ticker's figures fill in once selecting it has stored its history
 
     data_tbl = data['tickers']
+    try:
+        relations = get_relations(data, sData or [], tag=page_tag('/trend'))
+        corr, lead_lag = relations['corr'], relations['lead_lag']
+    except ComputeCancelled:
+        raise PreventUpdate
+    except ComputeError:
+        corr, lead_lag = [], []
+    data_tbl = merge_dict_lists(data_tbl, corr)
+    data_tbl = merge_dict_lists(data_tbl, lead_lag)
 
     rows = [
         dmc.TableTr(
@@ -542,6 +607,9 @@ def create_relation_table(data):
                 dmc.TableTd(element["exchange"]),
                 dmc.TableTd(element["impact"]),
                 dmc.TableTd(element["direction"]),
+                dmc.TableTd(element.get("Long-term Correlation")),
+                dmc.TableTd(element.get("Short-term Correlation")),
+                dmc.TableTd(element.get("Best Lag (weeks)")),
                 dmc.TableTd(dcc.Markdown(element["relation"])),
             ]
         )
@@ -556,6 +624,9 @@ def create_relation_table(data):
                 dmc.TableTh("Exchange"),
                 dmc.TableTh("Relation"),
                 dmc.TableTh("Direction"),
+                dmc.TableTh("Long-term Correlation"),
+                dmc.TableTh("Short-term Correlation"),
+                dmc.TableTh("Best Lag (weeks)"),
                 dmc.TableTh("Relationship with Trend"),
             ]
         )
@@ -567,4 +638,17 @@ def create_relation_table(data):
                     highlightOnHover=True,
                     withTableBorder=True,
                     withColumnBorders=True,)
-    return tbl
+
+    # ------------------------------------------ lead/lag profile chart -----------------------------------------------
+    lag_data, lag_series = lag_profile_chart_data(lead_lag, [item['ticker'] for item in lead_lag])
+    lag_chart = dmc.LineChart(
+        h=220,
+        dataKey="lag",
+        data=lag_data,
+        series=lag_series,
+        xAxisLabel="Weeks the trend leads the stock price",
+        withLegend=True,
+        withDots=False,
+        connectNulls=True,  # monthly trends only have a point every ~4 weeks
+    )
+    return tbl, lag_chart
@@ -1,32 +1,73 @@
 import os
+import threading
+import httpx
 from flask import g
 from werkzeug.local import LocalProxy
 from supabase.client import Client, ClientOptions
+from gotrue import SyncMemoryStorage
 from flask_storage import FlaskSessionStorage
 
 SUPABASE_URL = os.environ.get("SUPABASE_URL", "")
 SUPABASE_ANON_KEY = os.environ.get("SUPABASE_ANON_KEY", "")
 SUPABASE_SERVICE_ROLE_KEY = os.environ.get("SUPABASE_SERVICE_ROLE_KEY", "")
 
-def create_supabase_client(key: str) -> Client:
+# One keep-alive connection pool per process, shared by every Supabase client in it
+SUPABASE_TIMEOUT = float(os.environ.get("SUPABASE_TIMEOUT", 120))  # seconds, the postgrest default
+SUPABASE_POOL_SIZE = int(os.environ.get("SUPABASE_POOL_SIZE", 20))  # connections kept open per process
+SUPABASE_KEEPALIVE = float(os.environ.get("SUPABASE_KEEPALIVE", 60))  # seconds an idle connection stays open
+
+_process = {"pid": None, "transport": None, "service": None}
+_process_lock = threading.RLock()
+
+
+def _shared(name, build):
+    # per-process singletons, rebuilt in a forked worker so it never reuses its parent's sockets
+    with _process_lock:
+        if _process["pid"] != os.getpid():
+            _process.update(pid=os.getpid(), transport=None, service=None)
+        if _process[name] is None:
+            _process[name] = build()
+        return _process[name]
+
+
+def get_transport() -> httpx.HTTPTransport:
+    return _shared("transport", lambda: httpx.HTTPTransport(
+        http2=True,
+        limits=httpx.Limits(
+            max_connections=SUPABASE_POOL_SIZE,
+            max_keepalive_connections=SUPABASE_POOL_SIZE,
+            keepalive_expiry=SUPABASE_KEEPALIVE,
+        ),
+    ))
+
+
+def create_supabase_client(key: str, storage=None) -> Client:
+    # postgrest sets its base_url and auth headers on the httpx client it is given, so every Supabase client gets its
+    # own httpx.Client; only the transport (the connection pool) underneath is shared
+    http_client = httpx.Client(transport=get_transport(), timeout=SUPABASE_TIMEOUT, follow_redirects=True)
     return Client(
         SUPABASE_URL,
         key,
         options=ClientOptions(
-            storage=FlaskSessionStorage(),
-            flow_type="pkce"
+            storage=storage or FlaskSessionStorage(),
+            flow_type="pkce",
+            httpx_client=http_client,
         ),
     )
 
 def get_supabase_anon() -> Client:
+    # per request: its auth session lives in the user's Flask session
     if "supabase_anon" not in g:
         g.supabase_anon = create_supabase_client(SUPABASE_ANON_KEY)
     return g.supabase_anon
 
 def get_supabase_service() -> Client:
-    if "supabase_service" not in g:
-        g.supabase_service = create_supabase_client(SUPABASE_SERVICE_ROLE_KEY)
-    return g.supabase_service
+    # per process: the service role carries no user state, so one client serves every request and thread
+    def build():
+        client = create_supabase_client(SUPABASE_SERVICE_ROLE_KEY, storage=SyncMemoryStorage())
+        client.postgrest  # built lazily by supabase; build it here, under the lock
+        return client
+    return _shared("service", build)
 
 # Proxies for easier access
 supabase_anon: Client = LocalProxy(get_supabase_anon)
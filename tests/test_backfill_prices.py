@@ -0,0 +1,52 @@
+import pandas as pd
+import pytest
+from utils import price_cache, yfinance_functions
+from utils.EODHD_functions import eodhd_client, EODHDHTTPError
+from utils.price_fetch import cached_price_history
+from utils.yfinance_functions import YFinanceError
+from jobs.backfill_prices import backfill
+
+
+@pytest.fixture(autouse=True)
+def price_store(tmp_path, monkeypatch):
+    monkeypatch.setattr(price_cache, "PRICE_CACHE_PATH", str(tmp_path / "prices.sqlite"))
+
+
+def bars(from_date, to_date):
+    return pd.DataFrame({"date": pd.bdate_range(from_date, to_date),
+                         **{col: 1.0 for col in price_cache.PRICE_COLUMNS}})
+
+
+def test_backfill_seeds_every_ticker_through_the_provider_layer(monkeypatch):
+    eodhd_calls, yf_calls = [], []
+
+    def historical(ticker, from_date, to_date):
+        eodhd_calls.append(ticker)
+        if ticker == "GONE.US":
+            raise EODHDHTTPError(404, "Ticker Not Found", "eod/GONE.US")
+        return bars(from_date, to_date).assign(date=lambda df: df["date"].dt.strftime("%Y-%m-%d"))
+
+    def download_many(symbols, from_date, to_date):
+        yf_calls.append(sorted(symbols))
+        return {symbol: YFinanceError(f"no data for {symbol}") if symbol == "GONE" else bars(from_date, to_date)
+                for symbol in symbols}
+
+    monkeypatch.setattr(eodhd_client, "historical", historical)
+    monkeypatch.setattr(yfinance_functions, "get_historical_stock_data_many", download_many)
+
+    stocks = [("EODHD", "AAPL.US"), ("EODHD", "MSFT.US"), ("EODHD", "GONE.US"),
+              ("yfinance", "SNROF.US"), ("yfinance", "ADYEY.US")]
+    stats = backfill(stocks, "2024-01-01", "2024-03-29")
+
+    assert sorted(eodhd_calls) == ["AAPL.US", "GONE.US", "MSFT.US"]
+    assert ["ADYEY.US", "SNROF.US"] in yf_calls  # one batched download for the yfinance tickers
+    # GONE.US failed on EODHD and was retried on yfinance, which doesn't have it either
+    assert [symbol for symbol, _ in stats["failed"]] == ["GONE.US"]
+    for source, symbol in stocks:
+        history = cached_price_history(source, symbol, "2024-01-01", "2024-03-29")
+        assert (history is None) == (symbol == "GONE.US")
+
+    eodhd_calls.clear()
+    yf_calls.clear()
+    backfill(stocks[:2], "2024-01-01", "2024-03-29")  # already stored: nothing goes upstream
+    assert eodhd_calls == [] and yf_calls == []
@@ -0,0 +1,22 @@
+import numpy as np
+import pandas as pd
+from utils.helpers import get_corr
+
+
+def _ticker(name, days, rng):
+    return {'ticker': name, 'code': name, 'date': days.strftime("%Y-%m-%d").tolist(),
+            'close': (100 + rng.normal(0, 1, len(days)).cumsum()).tolist()}
+
+
+def test_get_corr_does_not_depend_on_the_other_tickers():
+    rng = np.random.default_rng(3)
+    days = pd.bdate_range("2022-01-03", "2024-12-31")
+    dense = _ticker("A", days[rng.random(len(days)) < 0.9], rng)
+    sparse = _ticker("B", days[::7], rng)  # trades on far fewer days than A
+    sundays = pd.date_range("2022-01-02", "2024-12-29", freq="W-SUN")
+    trend = ", ".join(f"{d:%m/%d/%Y}: {v}" for d, v in zip(sundays, rng.integers(10, 100, len(sundays))))
+    trend_st = ", ".join(trend.split(", ")[-13:])
+
+    together = get_corr(trend, trend_st, [dense, sparse])
+    alone = get_corr(trend, trend_st, [dense]) + get_corr(trend, trend_st, [sparse])
+    assert together == alone
@@ -0,0 +1,43 @@
+import json
+import pandas as pd
+import pytest
+from utils import price_cache
+from jobs.refresh_eod import RecordedBulk, refresh
+
+
+@pytest.fixture(autouse=True)
+def price_store(tmp_path, monkeypatch):
+    monkeypatch.setattr(price_cache, "PRICE_CACHE_PATH", str(tmp_path / "prices.sqlite"))
+
+
+def bars(dates, close=100.0):
+    return pd.DataFrame({"date": dates, **{col: close for col in price_cache.PRICE_COLUMNS}})
+
+
+def test_replayed_bulk_extends_covered_tickers_only(tmp_path):
+    with price_cache._connect() as conn:
+        price_cache._store_delta(conn, "AAPL.US", "2024-01-02", "2024-03-14",
+                                 bars(pd.bdate_range("2024-01-02", "2024-03-14")))
+        before = price_cache.get_coverage(conn, "AAPL.US")
+    recorded = tmp_path / "recorded"
+    recorded.mkdir()
+    (recorded / "US.json").write_text(json.dumps([
+        {"code": code, "exchange_short_name": "US", "date": "2024-03-15", "open": 1, "high": 2, "low": 1,
+         "close": 2, "adjusted_close": 2, "volume": 10}
+        for code in ("AAPL", "MSFT", "IBM")  # IBM isn't one of ours
+    ]))
+
+    stats = refresh([("AAPL.US", "US"), ("MSFT.US", "US"), ("NVDA.US", "US")], fetch_bulk=RecordedBulk(recorded))
+
+    assert (stats["exchanges"], stats["stored"], stats["extended"]) == (1, 2, 1)
+    assert stats["behind"] == ["MSFT.US"] and stats["missing"] == ["NVDA.US"]
+    with price_cache._connect() as conn:
+        assert price_cache.get_coverage(conn, "AAPL.US")[:2] == (before[0], "2024-03-15")
+        assert price_cache.get_coverage(conn, "MSFT.US") is None  # a stray day isn't a history
+    assert price_cache.load_cached_bars("MSFT.US", "2024-01-01", "2024-03-15") is None
+    assert price_cache.load_cached_bars("AAPL.US", "2024-03-15", "2024-03-15")["close"].tolist() == [2.0]
+
+
+def test_missing_recording_fails_only_that_exchange(tmp_path):
+    stats = refresh([("VOD.LSE", "LSE")], fetch_bulk=RecordedBulk(tmp_path))
+    assert stats["exchanges"] == 0 and [exchange for exchange, _ in stats["failed"]] == ["LSE"]
@@ -0,0 +1,66 @@
+import time
+import threading
+import pytest
+from utils import single_flight as sf
+
+
+@pytest.fixture(autouse=True)
+def lock_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(sf, "SINGLE_FLIGHT_LOCK_DIR", str(tmp_path))
+
+
+def same_bucket_keys():
+    outer = ("prices", "AAPL.US", "2024-01-01", "2024-06-30")
+    for i in range(100_000):
+        inner = ("eodhd", "eod/AAPL.US", i)
+        if sf._lock_path(inner) == sf._lock_path(outer):
+            return outer, inner
+    raise AssertionError("no colliding key found")
+
+
+def test_nested_file_locks_on_one_bucket_do_not_wait():
+    outer, inner = same_bucket_keys()
+    started = time.monotonic()
+    with sf.file_lock(outer, timeout=2):
+        with sf.file_lock(inner, timeout=2):
+            pass
+        assert sf._lock_path(outer) in sf._held  # the inner release keeps the outer lock
+    assert time.monotonic() - started < 1
+    assert not sf._held
+
+
+def test_nested_single_flight_on_one_bucket_does_not_wait():
+    outer, inner = same_bucket_keys()
+    started = time.monotonic()
+    result = sf.single_flight(outer, lambda: sf.single_flight(inner, lambda: "bars"))
+    assert result == "bars"
+    assert time.monotonic() - started < 1
+
+
+def test_file_lock_still_excludes_other_processes():
+    fcntl = pytest.importorskip("fcntl")
+    outer, _ = same_bucket_keys()
+    with sf.file_lock(outer):
+        with open(sf._lock_path(outer), "a") as other:  # another open file description, like another worker
+            with pytest.raises(BlockingIOError):
+                fcntl.flock(other, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+
+def test_concurrent_identical_calls_share_one_call():
+    calls = []
+    release = threading.Event()
+
+    def fetch():
+        calls.append(1)
+        release.wait(5)
+        return "bars"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(sf.single_flight("key", fetch))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.2)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert results == ["bars"] * 4 and len(calls) == 1
@@ -2,28 +2,156 @@ import requests
 import pandas as pd
 import os
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from utils.single_flight import single_flight
 
 
 load_dotenv()
 api_key = os.getenv("EODHD_API_KEY")
 pd.options.mode.chained_assignment = None  # default='warn'
 
+EODHD_BASE_URL = "https://eodhd.com/api"
+EODHD_CONNECT_TIMEOUT = float(os.getenv("EODHD_CONNECT_TIMEOUT", 3.05))
+EODHD_READ_TIMEOUT = float(os.getenv("EODHD_READ_TIMEOUT", 15))
+EODHD_RETRIES = int(os.getenv("EODHD_RETRIES", 3))
+EODHD_BACKOFF = float(os.getenv("EODHD_BACKOFF", 0.5))  # seconds, doubled on every retry
+EODHD_POOL_SIZE = int(os.getenv("EODHD_POOL_SIZE", 10))  # keep-alive connections per worker
+
+
+class EODHDError(Exception):
+    """Base class for failed EODHD requests."""
+
+
+class EODHDHTTPError(EODHDError):
+    """EODHD answered with a non-200 status (after retries, for 429/5xx)."""
+
+    def __init__(self, status_code, text, url=None):
+        super().__init__(f"{status_code} - {text}")
+        self.status_code = status_code
+        self.text = text
+        self.url = url
+
+
+class EODHDTimeout(EODHDError):
+    """EODHD did not connect or answer within the timeout."""
+
+
+class EODHDConnectionError(EODHDError):
+    """EODHD could not be reached."""
+
+
+# ------------------------------------------------ pooled EODHD client -------------------------------------------------
+class EODHDClient:
+    """
+    EODHD API client holding one keep-alive connection pool.
+
+    429 and 5xx responses and failed connects are retried with exponential backoff, honouring Retry-After. Every
+    request has a connect and read timeout so a slow upstream can't hang a worker thread.
+
+    Args:
+        token (str): EODHD API token.
+        timeout ((float, float)): (connect, read) timeout in seconds.
+        retries (int): retries after the first attempt.
+        backoff (float): backoff factor in seconds.
+        pool_size (int): connections kept open to eodhd.com.
+    """
+
+    def __init__(self, token=None, timeout=(EODHD_CONNECT_TIMEOUT, EODHD_READ_TIMEOUT), retries=EODHD_RETRIES,
+                 backoff=EODHD_BACKOFF, pool_size=EODHD_POOL_SIZE, base_url=EODHD_BASE_URL):
+        self.token = token if token is not None else api_key
+        self.timeout = timeout
+        self.base_url = base_url
+        retry = Retry(
+            total=retries,
+            read=False,  # a read timeout is raised at once rather than multiplying the wait
+            backoff_factor=backoff,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset({"GET"}),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(max_retries=retry, pool_connections=1, pool_maxsize=pool_size)
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def get_json(self, path, **params):
+        """
+        GET {base_url}/{path} and return the decoded JSON body.
+
+        Identical concurrent requests share one upstream call (see utils.single_flight), so treat the returned
+        object as read-only.
+
+        Raises:
+            EODHDHTTPError: non-200 response.
+            EODHDTimeout: connect or read timeout.
+            EODHDConnectionError: the host could not be reached.
+        """
+        key = ("eodhd", self.base_url, path, tuple(sorted(params.items())))
+        return single_flight(key, self._get_json, path, params)
+
+    def _get_json(self, path, params):
+        url = f"{self.base_url}/{path}"
+        params = {**params, "api_token": self.token, "fmt": "json"}
+        try:
+            response = self.session.get(url, params=params, timeout=self.timeout)
+        except requests.exceptions.Timeout as e:
+            raise EODHDTimeout(f"{path}: {e}") from e
+        except requests.exceptions.RetryError as e:
+            raise EODHDHTTPError(None, str(e), url) from e
+        except requests.exceptions.ConnectionError as e:
+            raise EODHDConnectionError(f"{path}: {e}") from e
+
+        if response.status_code != 200:
+            raise EODHDHTTPError(response.status_code, response.text, url)
+        try:
+            return response.json()
+        except ValueError as e:
+            raise EODHDError(f"{path}: invalid JSON response") from e
+
+    def historical(self, ticker, from_date, to_date):
+        data = self.get_json(f"eod/{ticker}", **{"from": from_date, "to": to_date, "period": "d"})
+        # an error payload ({"message": ...}) or bars without dates would otherwise fail later, untyped
+        if not isinstance(data, list) or any(not isinstance(bar, dict) or "date" not in bar for bar in data):
+            raise EODHDError(f"eod/{ticker}: unexpected response {str(data)[:200]}")
+        return pd.DataFrame.from_dict(data)
+
+    def bulk_last_day(self, exchange_code, date=None):
+        """One day's bars for every symbol on an exchange (the last trading day unless `date` is given)."""
+        params = {"date": date} if date else {}
+        return pd.DataFrame.from_dict(self.get_json(f"eod-bulk-last-day/{exchange_code}", **params))
+
+    def real_time(self, tickers):
+        tickers_str = ','.join(tickers) if isinstance(tickers, list) else tickers
+        return self.get_json(f"real-time/{tickers_str}")
+
+    def exchanges(self):
+        return pd.DataFrame.from_dict(self.get_json("exchanges-list/"))
+
+    def tickers(self, exchange_code):
+        return pd.DataFrame.from_dict(self.get_json(f"exchange-symbol-list/{exchange_code}"))
+
+
+eodhd_client = EODHDClient()
+
+
 def get_historical_stock_data(ticker, from_date, to_date):
-    # Construct the URL with function inputs
-    url = f'https://eodhd.com/api/eod/{ticker}?from={from_date}&to={to_date}&period=d&api_token={api_key}&fmt=json'
+    """Daily bars for ticker as a DataFrame. Raises EODHDError on failure."""
+    return eodhd_client.historical(ticker, from_date, to_date)
 
-    # Make the API request and get the response data
-    response = requests.get(url)
+def get_bulk_last_day(exchange_code, date=None):
+    """
+    End-of-day bars for every symbol on an exchange in one call.
 
-    # Check if the request was successful
-    if response.status_code == 200:
-        data = response.json()
-        df = pd.DataFrame.from_dict(data)
-        return df
-    else:
-        return f"Error: {response.status_code} - {response.text}"
+    Returns:
+        pd.DataFrame: code, exchange_short_name, date, open, high, low, close, adjusted_close, volume.
+    """
+    return eodhd_client.bulk_last_day(exchange_code, date)
 
 def get_weekly_data(df):
+    # pages read weekly bars precomputed in the price cache (utils.price_cache.PRICE_LEVELS); kept for ad-hoc use
+    df = df.copy()
     df['date'] = pd.to_datetime(df['date'])
     df['week_start'] = df['date'] - pd.to_timedelta(df['date'].dt.weekday, unit='d')
     weekly_df = (
@@ -39,6 +167,7 @@ def get_weekly_data(df):
     return weekly_df
 
 def get_monthly_data(df):
+  df = df.copy()
   df['date'] = pd.to_datetime(df['date'])
   df = df.set_index('date', inplace=False)
   monthly_df = df.resample('ME').agg({
@@ -52,50 +181,19 @@ def get_monthly_data(df):
   return monthly_df
 
 def get_real_time_stock_data(ticker):
-  url = f'https://eodhd.com/api/real-time/{ticker}?api_token={api_key}&fmt=json'
-  response = requests.get(url)
-  if response.status_code == 200:
-      data = response.json()
-      #df = pd.DataFrame.from_dict([data])
-      return data
-  else:
-      return f"Error: {response.status_code} - {response.text}"
+    return eodhd_client.real_time(ticker)
 
 
 def get_real_time_multi_stock_data(tickers):
     #15-20 tickers at a time
-    if isinstance(tickers, list):
-        tickers_str = ','.join(tickers)
-    else:
-        tickers_str = tickers  # Support single tickers as well
-    url = f'https://eodhd.com/api/real-time/{tickers_str}?api_token={api_key}&fmt=json'
-    response = requests.get(url)
-    if response.status_code == 200:
-        data = response.json()
-        return data
-    else:
-        return f"Error: {response.status_code} - {response.text}"
+    return eodhd_client.real_time(tickers)
 
 def get_exhanges():
-  url = f'https://eodhd.com/api/exchanges-list/?api_token={api_key}&fmt=json'
-  response = requests.get(url)
-  if response.status_code == 200:
-      data = response.json()
-      df = pd.DataFrame.from_dict(data)
-      return df
-  else:
-      return f"Error: {response.status_code} - {response.text}"
+    return eodhd_client.exchanges()
 
 def get_tickers(exchange_code):
-  #US, AU,
-  url = f'https://eodhd.com/api/exchange-symbol-list/{exchange_code}?api_token={api_key}&fmt=json'
-  response = requests.get(url)
-  if response.status_code == 200:
-    data = response.json()
-    df = pd.DataFrame.from_dict(data)
-    return df
-  else:
-      return f"Error: {response.status_code} - {response.text}"
+    #US, AU,
+    return eodhd_client.tickers(exchange_code)
 
 #df = get_exhanges()
 #df.to_csv("EODHD_Exchanges.csv")
@@ -0,0 +1,149 @@
+import os
+import uuid
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, CancelledError, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from flask import has_request_context, session
+
+# CPU-heavy analytics (STL, correlations) run in a process pool so web threads only wait on futures
+COMPUTE_WORKERS = int(os.getenv("COMPUTE_WORKERS", 2))
+COMPUTE_MAX_PENDING = int(os.getenv("COMPUTE_MAX_PENDING", 16))  # queued + running tasks per web worker
+COMPUTE_TIMEOUT = float(os.getenv("COMPUTE_TIMEOUT", 30))  # seconds a callback waits for a result
+
+
+class ComputeError(Exception):
+    """Base class for failures of the compute executor."""
+
+
+class ComputeBusy(ComputeError):
+    """The task queue is full."""
+
+
+class ComputeTimeout(ComputeError):
+    """The task did not finish within its timeout."""
+
+
+class ComputeCancelled(ComputeError):
+    """The task was cancelled, e.g. because the user navigated away."""
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(COMPUTE_MAX_PENDING)
+_tagged = {}  # (session id, page) -> set of pending futures
+_tagged_lock = threading.Lock()
+
+
+def _get_pool():
+    # created lazily (and re-created after a fork) so each gunicorn worker owns its own pool
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            _pool = ProcessPoolExecutor(max_workers=COMPUTE_WORKERS, mp_context=multiprocessing.get_context(method))
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def session_id():
+    """Stable id for the current browser session, or None outside a request."""
+    if not has_request_context():
+        return None
+    if "compute_id" not in session:
+        session["compute_id"] = uuid.uuid4().hex
+    return session["compute_id"]
+
+
+def page_tag(page):
+    """Tag for tasks started by `page` in the current session, so they can be cancelled on navigation."""
+    sid = session_id()
+    return None if sid is None else (sid, page)
+
+
+def _track(tag, future):
+    if tag is None:
+        return
+    with _tagged_lock:
+        _tagged.setdefault(tag, set()).add(future)
+
+    def untrack(f):
+        with _tagged_lock:
+            futures = _tagged.get(tag)
+            if futures is not None:
+                futures.discard(f)
+                if not futures:
+                    _tagged.pop(tag, None)
+
+    future.add_done_callback(untrack)
+
+
+def run_task(fn, *args, tag=None, timeout=None, cancel_on_timeout=True, **kwargs):
+    """
+    Run fn(*args, **kwargs) in the compute pool and wait for the result.
+
+    Args:
+        fn (callable): a picklable, module-level function.
+        tag (tuple): optional page_tag() so the task is cancelled if the session navigates away.
+        timeout (float): seconds to wait, defaults to COMPUTE_TIMEOUT.
+        cancel_on_timeout (bool): cancel a task still queued when the wait times out; pass False for tasks that store
+            their own result, so a later request finds it.
+
+    Raises:
+        ComputeBusy: the queue already holds COMPUTE_MAX_PENDING tasks.
+        ComputeTimeout: no result within the timeout (the task is cancelled if it hasn't started, unless
+            cancel_on_timeout is False).
+        ComputeCancelled: the task was cancelled before it ran.
+    """
+    if not _slots.acquire(blocking=False):
+        raise ComputeBusy(f"compute queue full ({COMPUTE_MAX_PENDING} tasks)")
+
+    try:
+        future = _get_pool().submit(fn, *args, **kwargs)
+    except BrokenProcessPool as e:
+        _slots.release()
+        _reset_pool()
+        raise ComputeError("compute pool crashed, it will be restarted") from e
+    except BaseException:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda f: _slots.release())
+    _track(tag, future)
+
+    try:
+        return future.result(timeout=COMPUTE_TIMEOUT if timeout is None else timeout)
+    except FutureTimeoutError as e:
+        if cancel_on_timeout:
+            future.cancel()
+        raise ComputeTimeout(f"{getattr(fn, '__name__', fn)} took longer than {timeout or COMPUTE_TIMEOUT}s") from e
+    except CancelledError as e:
+        raise ComputeCancelled(f"{getattr(fn, '__name__', fn)} was cancelled") from e
+    except BrokenProcessPool as e:
+        _reset_pool()
+        raise ComputeError("compute pool crashed, it will be restarted") from e
+
+
+def cancel_session_tasks(keep_page=None):
+    """
+    Cancel the current session's queued tasks for every page except `keep_page`.
+
+    Tasks already running in a worker process cannot be interrupted; they finish and their result is dropped.
+
+    Returns:
+        int: number of tasks cancelled.
+    """
+    sid = session_id()
+    if sid is None:
+        return 0
+    with _tagged_lock:
+        futures = [f for (tag_sid, page), fs in _tagged.items() if tag_sid == sid and page != keep_page for f in fs]
+    return sum(f.cancel() for f in futures)
@@ -0,0 +1,103 @@
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from supabase_client import supabase_service
+
+# user_profiles.subscription_status decides the paywall on every discover callback; it is kept in a small SQLite file
+# shared by the gunicorn workers, so the Stripe webhook (handled by any one worker) invalidates it for all of them
+ENTITLEMENT_CACHE_PATH = os.getenv("ENTITLEMENT_CACHE_PATH", os.path.join("cache", "entitlements.sqlite"))
+ENTITLEMENT_TTL = int(os.getenv("ENTITLEMENT_TTL", 300))  # seconds; bounds staleness from edits outside the webhook
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entitlements (
+    user_id TEXT PRIMARY KEY,
+    subscription_status TEXT,
+    fetched_at REAL NOT NULL,
+    invalidated_at REAL NOT NULL DEFAULT 0
+);
+"""
+
+
+@contextmanager
+def _connect(path=None):
+    path = path or ENTITLEMENT_CACHE_PATH
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+        yield conn
+        conn.commit()
+    finally:
+        conn.close()
+
+
+# ----------------------------------------------- subscription status -------------------------------------------------
+def fetch_subscription_status(user_id):
+    """user_profiles.subscription_status straight from Supabase."""
+    response = (
+        supabase_service.table("user_profiles")
+        .select("subscription_status")
+        .eq("id", user_id)
+        .single()
+        .execute()
+    )
+    return response.data["subscription_status"]
+
+
+def get_subscription_status(user_id, fetch=fetch_subscription_status, ttl=None):
+    """
+    A user's subscription status, from the local cache while it is younger than ENTITLEMENT_TTL.
+
+    Args:
+        user_id (str): user_profiles.id (the Supabase auth user id).
+        fetch (callable): fetch(user_id) -> status, called on a miss.
+        ttl (int): seconds a cached status is trusted, ENTITLEMENT_TTL by default.
+
+    Returns:
+        str: 'active', 'free' or None (no subscription yet).
+    """
+    ttl = ENTITLEMENT_TTL if ttl is None else ttl
+    with _connect() as conn:
+        row = conn.execute(
+            "SELECT subscription_status, fetched_at, invalidated_at FROM entitlements WHERE user_id = ?", (user_id,)
+        ).fetchone()
+    if row is not None and row[1] > row[2] and time.time() - row[1] < ttl:
+        return row[0]
+
+    started = time.time()
+    status = fetch(user_id)
+    with _connect() as conn:
+        # a webhook that invalidated the user while we were fetching wins: the status we read may predate it
+        conn.execute(
+            """
+            INSERT INTO entitlements (user_id, subscription_status, fetched_at) VALUES (?, ?, ?)
+            ON CONFLICT (user_id) DO UPDATE SET
+                subscription_status = excluded.subscription_status, fetched_at = excluded.fetched_at
+            WHERE excluded.fetched_at > entitlements.invalidated_at
+            """,
+            (user_id, status, started),
+        )
+    return status
+
+
+def invalidate_subscription_status(user_ids=None):
+    """
+    Drop cached statuses so the next paywall check reads user_profiles again.
+
+    Args:
+        user_ids (iterable[str]): the users whose profile changed; None drops every cached status.
+    """
+    now = time.time()
+    with _connect() as conn:
+        if user_ids is None:
+            conn.execute("UPDATE entitlements SET invalidated_at = ?", (now,))
+        else:
+            conn.executemany(
+                """
+                INSERT INTO entitlements (user_id, fetched_at, invalidated_at) VALUES (?, 0, ?)
+                ON CONFLICT (user_id) DO UPDATE SET invalidated_at = excluded.invalidated_at
+                """,
+                [(user_id, now) for user_id in user_ids],
+            )
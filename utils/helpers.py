@@ -1,6 +1,10 @@
-from datetime import datetime, timedelta
-import calendar
+from datetime import datetime
 import math
+import os
+import re
+import hashlib
+import threading
+from collections import OrderedDict
 import pandas as pd
 import numpy as np
 # -------------------------------------- format int to string with K, M, B --------------------------------------------
@@ -147,11 +151,108 @@ def get_first_last_multi_trends(data):
     return earliest, latest
 
 
+# ------------------------------------ parse trend string into numpy arrays -------------------------------------------
+_TREND_ENTRY_RE = re.compile(r"(\d{1,2})/(\d{1,2})/(\d{4})\s*:\s*([+-]?\d+(?:,\d{3})*)")
+
+
+def _entries_to_arrays(entries):
+    """
+    Convert (month, day, year, value) string tuples into (dates, values) arrays in a single vectorised pass.
+    """
+    if not entries:
+        return np.empty(0, dtype="datetime64[D]"), np.empty(0, dtype=np.int64)
+
+    arr = np.array(entries)
+    mdy = arr[:, :3].astype(np.int64)
+    months = ((mdy[:, 2] - 1970) * 12 + mdy[:, 0] - 1).astype("datetime64[M]")
+    dates = months.astype("datetime64[D]") + (mdy[:, 1] - 1)
+
+    raw_values = arr[:, 3]
+    if np.char.find(raw_values, ",").max() >= 0:
+        raw_values = np.char.replace(raw_values, ",", "")
+    values = raw_values.astype(np.int64)
+    return dates, values
+
+
+def parse_trend(data_str):
+    """
+    Parse a 'MM/DD/YYYY: value, ...' trend string into NumPy arrays.
+
+    Values may contain thousands separators ("1,234"). Malformed entries are skipped.
+
+    Args:
+        data_str (str): A string like "06/01/2024: 10783, 07/01/2024: 77881,..."
+
+    Returns:
+        (np.ndarray, np.ndarray): (dates as datetime64[D], values as int64)
+    """
+    return _entries_to_arrays(_TREND_ENTRY_RE.findall(data_str or ""))
+
+
+def parse_trends(data_strs):
+    """
+    Parse many trend strings at once. Entries from every row are converted in one batch and split back per row.
+
+    Args:
+        data_strs (list[str]): Trend strings, e.g. the 'trend' column of a page of kw_joined rows.
+
+    Returns:
+        list[(np.ndarray, np.ndarray)]: One (dates, values) pair per input string, in the same order.
+    """
+    matches = [_TREND_ENTRY_RE.findall(s or "") for s in data_strs]
+    if not matches:
+        return []
+
+    dates, values = _entries_to_arrays([entry for row in matches for entry in row])
+    splits = np.cumsum([len(row) for row in matches])[:-1]
+    return list(zip(np.split(dates, splits), np.split(values, splits)))
+
+
+def trend_dates_to_datetimes(dates):
+    """Convert a datetime64 array into a list of datetime objects (for plotly / pandas comparisons)."""
+    return dates.astype("datetime64[us]").tolist()
+
+
+# ---------------------- snaps datetime64 dates to the last day of their month / week ---------------------------------
+def snap_to_month_end(dates):
+    """
+    Move every date in a datetime64 array to the last day of its month.
+
+    Args:
+        dates (np.ndarray): datetime64 dates, e.g. from parse_trend.
+
+    Returns:
+        np.ndarray: datetime64[D] month-end dates.
+    """
+    return (dates.astype("datetime64[M]") + 1).astype("datetime64[D]") - 1
+
+
+def snap_to_week_end(dates):
+    """
+    Move every date in a datetime64 array to the last day (Sunday) of its week.
+
+    Args:
+        dates (np.ndarray): datetime64 dates, e.g. from parse_trend.
+
+    Returns:
+        np.ndarray: datetime64[D] week-end dates.
+    """
+    days = dates.astype("datetime64[D]")
+    # 1970-01-01 was a Thursday, so (days + 3) % 7 is the weekday with Monday=0, Sunday=6
+    weekday = (days.astype(np.int64) + 3) % 7
+    return days + (6 - weekday)
+
+
+def _format_trend(dates, values):
+    formatted = pd.DatetimeIndex(dates).strftime("%m/%d/%Y")
+    return ", ".join(f"{d}: {v}" for d, v in zip(formatted, values.tolist()))
+
+
 # ---------------------- converts the MM/DD/YYYY from 1st day of the month to last day of the month -------------------
 def convert_to_last_day_of_month(input_str: str) -> str:
     """
     Convert dates in 'MM/DD/YYYY: Value' format from the first day of the month
-    to the last day of the month.
+    to the last day of the month. Chart code should use snap_to_month_end on parsed arrays instead.
 
     Args:
         input_str (str): A string like "06/01/2024: 10783, 07/01/2024: 77881, ..."
@@ -160,23 +261,14 @@ def convert_to_last_day_of_month(input_str: str) -> str:
         str: Updated string with last day of each month instead of the first.
         "06/30/2024: 10783, 07/31/2024: 77881, 08/31/2024: 94655"
     """
-    parts = [p.strip() for p in input_str.split(",") if p.strip()]
-    output_parts = []
-
-    for part in parts:
-        date_str, val = [x.strip() for x in part.split(":")]
-        dt = datetime.strptime(date_str, "%m/%d/%Y")
-        last_day = calendar.monthrange(dt.year, dt.month)[1]  # last day of the month
-        new_date = dt.replace(day=last_day).strftime("%m/%d/%Y")
-        output_parts.append(f"{new_date}: {val}")
-
-    return ", ".join(output_parts)
+    dates, values = parse_trend(input_str)
+    return _format_trend(snap_to_month_end(dates), values)
 
 # ---------------------- converts the MM/DD/YYYY from 1st day of the week to last day of the week -------------------
 def convert_to_week_end(input_str: str) -> str:
     """
     Convert dates in 'MM/DD/YYYY: Value' format to the last day (Sunday)
-    of that week.
+    of that week. Chart code should use snap_to_week_end on parsed arrays instead.
 
     Args:
         input_str (str): A string like "06/01/2024: 10783, 07/01/2024: 77881, ..."
@@ -184,62 +276,180 @@ def convert_to_week_end(input_str: str) -> str:
     Returns:
         str: Updated string with dates set to the last day of their week.
     """
-    parts = [p.strip() for p in input_str.split(",") if p.strip()]
-    output_parts = []
-
-    for part in parts:
-        date_str, val = [x.strip() for x in part.split(":")]
-        dt = datetime.strptime(date_str, "%m/%d/%Y")
+    dates, values = parse_trend(input_str)
+    return _format_trend(snap_to_week_end(dates), values)
 
-        # weekday(): Monday=0, Sunday=6 → find days to add until Sunday
-        days_to_sunday = 6 - dt.weekday()
-        week_end = dt + timedelta(days=days_to_sunday)
-
-        new_date = week_end.strftime("%m/%d/%Y")
-        output_parts.append(f"{new_date}: {val}")
+# ------------------------------ process-wide LRU cache of parsed + resampled trend series ----------------------------
+class TrendSeriesCache:
+    """
+    Size-bounded LRU cache of parsed trend series.
 
-    return ", ".join(output_parts)
+    Keys are (hash of the raw trend string, period) and values are the (dates, values) arrays after period
+    conversion. The bound is on the total bytes held by the arrays, so one instance per gunicorn worker can be
+    sized from TREND_CACHE_MAX_BYTES. Cached arrays are read-only; copy them before mutating.
+    """
 
-# ---------------------- Prepare timeseries string to list of dictionaries for dcc.Graph -----------------------------
-def parse_data_for_charts(data_str, period):
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(data_str, period):
+        return hashlib.blake2b((data_str or "").encode(), digest_size=16).digest(), period
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, series):
+        for arr in series:
+            arr.flags.writeable = False
+        size = sum(arr.nbytes for arr in series)
+        if size > self.max_bytes:
+            return series
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= sum(arr.nbytes for arr in old)
+            self._entries[key] = series
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= sum(arr.nbytes for arr in evicted)
+                self.evictions += 1
+        return series
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self.current_bytes, "max_bytes": self.max_bytes,
+                    "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+
+trend_cache = TrendSeriesCache(max_bytes=int(os.getenv("TREND_CACHE_MAX_BYTES", 32 * 1024 * 1024)))
+
+
+def get_trend_series(data_str, period='daily'):
     """
-    Convert a string of 'MM/DD/YYYY: volume' pairs into separate lists
-    for dates and volumes.
+    Return the parsed (dates, values) arrays of a trend string converted to `period`, using the process-wide cache.
 
     Args:
         data_str (str): String with entries like "MM/DD/YYYY: volume, ..."
         period (str): monthly, weekly or daily
 
     Returns:
-        (list, list): (dates, volumes)
+        (np.ndarray, np.ndarray): read-only (dates as datetime64[D], values as int64)
     """
+    key = TrendSeriesCache.make_key(data_str, period)
+    series = trend_cache.get(key)
+    if series is not None:
+        return series
+
+    dates, values = parse_trend(data_str)
     if period == 'monthly':
-        data_str = convert_to_last_day_of_month(data_str)
+        dates = snap_to_month_end(dates)
     elif period == 'weekly':
-        data_str = convert_to_week_end(data_str)
+        dates = snap_to_week_end(dates)
     elif period == 'daily':
         pass
     else:
         print("invalid period input")
 
-    pairs = [item.strip() for item in data_str.split(",") if item.strip()]
+    return trend_cache.put(key, (dates, values))
 
-    dates, volumes = [], []
 
-    for pair in pairs:
-        date_str, volume_str = pair.split(": ")
-        date_obj = datetime.strptime(date_str, "%m/%d/%Y")
+# ---------------------- Prepare timeseries string to list of dictionaries for dcc.Graph -----------------------------
+def parse_data_for_charts(data_str, period):
+    """
+    Convert a string of 'MM/DD/YYYY: volume' pairs into separate lists
+    for dates and volumes.
+
+    Args:
+        data_str (str): String with entries like "MM/DD/YYYY: volume, ..."
+        period (str): monthly, weekly or daily
 
-        dates.append(date_obj)
-        volumes.append(int(volume_str))
+    Returns:
+        (list, list): (dates, volumes)
+    """
+    dates, volumes = get_trend_series(data_str, period)
 
-    return dates, volumes
+    return trend_dates_to_datetimes(dates), volumes.tolist()
 
 # ----------------------------------------------- Round 3 sig fig -----------------------------------------------------
 def round_sig(x, sig=3):
     return round(x, sig - int(math.floor(math.log10(abs(x)))) - 1) if x != 0 else 0
 
 
+# ------------------------------------ nearest-date (as-of) alignment of date arrays ----------------------------------
+def nearest_date_positions(dates, ref_dates):
+    """
+    For every date in `dates`, find the position of the nearest date in `ref_dates` with one searchsorted.
+
+    Dates before the first / after the last reference date map to the first / last reference date.
+    Ties go to the earlier reference date.
+
+    Args:
+        dates (np.ndarray): datetime64 dates to align (any order).
+        ref_dates (np.ndarray): sorted, unique datetime64 reference dates.
+
+    Returns:
+        np.ndarray: int positions into ref_dates, one per input date.
+    """
+    dates = np.asarray(dates)
+    ref_dates = np.asarray(ref_dates)
+    if len(ref_dates) == 0:
+        raise ValueError("ref_dates must not be empty")
+    if len(ref_dates) == 1:
+        return np.zeros(len(dates), dtype=np.intp)
+
+    common = np.result_type(dates.dtype, ref_dates.dtype)
+    dates = dates.astype(common, copy=False)
+    ref_dates = ref_dates.astype(common, copy=False)
+
+    pos = np.clip(np.searchsorted(ref_dates, dates), 1, len(ref_dates) - 1)
+    before, after = ref_dates[pos - 1], ref_dates[pos]
+    return np.where(dates - before <= after - dates, pos - 1, pos)
+
+
+def align_to_nearest_dates(dates, ref_dates, ref_values):
+    """
+    As-of join: pick, for every date, the value of the nearest reference date.
+
+    Args:
+        dates (np.ndarray): datetime64 dates to align.
+        ref_dates (np.ndarray): datetime64 reference dates (any order, duplicates keep the first value).
+        ref_values (np.ndarray): values belonging to ref_dates.
+
+    Returns:
+        (np.ndarray, np.ndarray): (matched reference dates, matched reference values), one per input date.
+    """
+    ref_dates, first_idx = np.unique(ref_dates, return_index=True)
+    ref_values = np.asarray(ref_values)[first_idx]
+    pos = nearest_date_positions(dates, ref_dates)
+    return ref_dates[pos], ref_values[pos]
+
+
+def to_day_array(dates):
+    """Convert a list/Series of dates or date strings into a datetime64[D] array."""
+    return pd.to_datetime(pd.Series(dates)).to_numpy().astype("datetime64[D]")
+
+
 # -------------------------------------------- adj df1 to dates of df2 ------------------------------------------------
 def adjust_to_nearest_dates(df1, df2):
     """
@@ -251,6 +461,8 @@ def adjust_to_nearest_dates(df1, df2):
       - If it falls after the latest date in df2, it is mapped to the last date in df2.
       - Otherwise, it is mapped to whichever date in df2’s index is closest (before or after).
 
+    Prefer align_to_nearest_dates on arrays in new code; it avoids the DataFrame copy.
+
     Args:
         df1 (pd.DataFrame): The DataFrame whose index will be adjusted.
         df2 (pd.DataFrame): The reference DataFrame providing valid dates.
@@ -259,48 +471,69 @@ def adjust_to_nearest_dates(df1, df2):
         pd.DataFrame: A copy of df1 with its index replaced by the nearest dates from df2.
     """
     ref_dates = df2.index.sort_values().unique()
-
-    adjusted_index = []
-    for d in df1.index:
-        pos = ref_dates.searchsorted(d)
-        if pos == 0:
-            adjusted_index.append(ref_dates[0])
-        elif pos == len(ref_dates):
-            adjusted_index.append(ref_dates[-1])
-        else:
-            before, after = ref_dates[pos - 1], ref_dates[pos]
-            adjusted_index.append(before if abs(d - before) <= abs(after - d) else after)
+    pos = nearest_date_positions(df1.index.values, ref_dates.values)
 
     df1 = df1.copy()
-    df1.index = adjusted_index
+    df1.index = ref_dates[pos]
     return df1
 
 
 # ------------------------------------ get correlation between trend and stock price ----------------------------------
-def get_corr(trend, price_data, lt=True):
-    pairs = [p.strip() for p in trend.split(",") if p.strip()]
-    trend = [(datetime.strptime(d.split(":")[0].strip(), "%m/%d/%Y"),
-                     int(d.split(":")[1].strip().replace(",", ""))) for d in pairs]
-    df_trend = pd.DataFrame(trend, columns=["date", "trend_volume"]).set_index("date")
-
-    if lt==True:
-        corr_name = 'Long-term Correlation'
-    else:
-        corr_name = 'Short-term Correlation'
+def stack_close_prices(price_data):
+    """
+    Stack several tickers' close prices onto one shared calendar.
 
-    results = []
-    for price_dict in price_data:
-        df_price = pd.DataFrame(price_dict)
-        df_price["date"] = pd.to_datetime(df_price["date"])
-        df_price = df_price.set_index("date")
-        df_trend = adjust_to_nearest_dates(df_trend, df_price)
-        df_combined = df_price.join(df_trend, how="inner")
-        correlation = df_combined["close"].corr(df_combined["trend_volume"])
-        correlation = round(correlation,2)
-        ticker = price_dict['ticker']
-        code = price_dict['code']
-        results.append({'ticker':ticker, 'code':code, corr_name:correlation})
-    return results
+    Args:
+        price_data (list[dict]): [{'date': [...], 'close': [...], ...}, ...] one dict per ticker.
+
+    Returns:
+        (np.ndarray, np.ndarray): (calendar as sorted datetime64[D], closes as (tickers, calendar) floats with NaN
+        where a ticker has no bar on that date)
+    """
+    ticker_dates = [to_day_array(price_dict["date"]) for price_dict in price_data]
+    calendar = np.unique(np.concatenate(ticker_dates)) if ticker_dates else np.empty(0, dtype="datetime64[D]")
+
+    closes = np.full((len(price_data), len(calendar)), np.nan)
+    for row, dates, price_dict in zip(closes, ticker_dates, price_data):
+        row[np.searchsorted(calendar, dates)] = pd.to_numeric(pd.Series(price_dict["close"]), errors="coerce")
+    return calendar, closes
+
+
+def _corr_on_calendar(calendar, closes, dates, volumes):
+    # align the trend dates to each ticker's own bars (nearest date where that row has a close), so a ticker's r
+    # doesn't depend on which other tickers share the calendar; then correlate every ticker in one pass
+    aligned = np.full((len(closes), len(dates)), np.nan)
+    if len(dates) == 0:
+        return np.full(len(closes), np.nan)
+    for row, out in zip(closes, aligned):
+        has_bar = ~np.isnan(row)
+        if has_bar.any():
+            out[:] = row[has_bar][nearest_date_positions(dates, calendar[has_bar])]
+    return masked_pearson(aligned, volumes)
+
+
+def get_corr(trend, trend_st, price_data):
+    """
+    Long-term and short-term correlation between a keyword's trend and every related ticker, in one call.
+
+    Args:
+        trend (str): long-term trend string, 'MM/DD/YYYY: value, ...'
+        trend_st (str): short-term trend string, 'MM/DD/YYYY: value, ...'
+        price_data (list[dict]): [{'ticker', 'code', 'date': [...], 'close': [...]}, ...] as in price-data-store
+
+    Returns:
+        list[dict]: [{'ticker', 'code', 'Long-term Correlation', 'Short-term Correlation'}, ...]
+    """
+    if not price_data:
+        return []
+
+    calendar, closes = stack_close_prices(price_data)
+    long_r = _corr_on_calendar(calendar, closes, *get_trend_series(trend))
+    short_r = _corr_on_calendar(calendar, closes, *get_trend_series(trend_st))
+
+    return [{'ticker': price_dict['ticker'], 'code': price_dict['code'],
+             'Long-term Correlation': _round_corr(lt), 'Short-term Correlation': _round_corr(st)}
+            for price_dict, lt, st in zip(price_data, long_r, short_r)]
 
 def safe_corr(a, b):
     """Return Pearson r, or None if not enough clean data or zero variance."""
@@ -313,82 +546,452 @@ def safe_corr(a, b):
     r = s["a"].corr(s["b"])
     return None if pd.isna(r) else round(float(r), 2)
 
+def masked_pearson(x, y, mask=None):
+    """
+    Row-wise Pearson r of two (k, n) arrays (either may be a broadcastable (n,) vector) in one NumPy pass.
+
+    Points that are NaN/inf or excluded by `mask` are ignored. Rows with fewer than 2 valid points or zero
+    variance come back as NaN, mirroring safe_corr.
+
+    Args:
+        x (np.ndarray): (n,) or (k, n) values.
+        y (np.ndarray): (n,) or (k, n) values.
+        mask (np.ndarray): optional (k, n) bool, True where a point should be used.
+
+    Returns:
+        np.ndarray: (k,) correlations.
+    """
+    x, y = np.broadcast_arrays(np.asarray(x, dtype=float), np.asarray(y, dtype=float))
+    valid = np.isfinite(x) & np.isfinite(y)
+    if mask is not None:
+        valid &= mask
+
+    count = valid.sum(axis=-1)
+    safe_count = np.maximum(count, 1)
+    x = np.where(valid, x, 0.0)
+    y = np.where(valid, y, 0.0)
+    dx = np.where(valid, x - (x.sum(axis=-1) / safe_count)[..., None], 0.0)
+    dy = np.where(valid, y - (y.sum(axis=-1) / safe_count)[..., None], 0.0)
+
+    var_x = (dx * dx).sum(axis=-1)
+    var_y = (dy * dy).sum(axis=-1)
+    cov = (dx * dy).sum(axis=-1)
+
+    # relative tolerance so constant series don't sneak through on rounding error of the mean
+    flat_x = var_x <= 1e-12 * np.maximum((x * x).sum(axis=-1), np.finfo(float).tiny)
+    flat_y = var_y <= 1e-12 * np.maximum((y * y).sum(axis=-1), np.finfo(float).tiny)
+    bad = (count < 2) | flat_x | flat_y
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        r = cov / np.sqrt(var_x * var_y)
+    return np.where(bad, np.nan, np.clip(r, -1.0, 1.0))
+
+
+def batch_corr_companies(price_dates, close, trends, months_window=2):
+    """
+    Long- and short-term correlation of one price series against many trend series at once.
+
+    Every trend is as-of aligned onto the price dates, stacked into a (keywords, bars) grid and correlated in one
+    masked pass. The short-term window is the last `months_window` months before each trend's latest aligned date.
+
+    Args:
+        price_dates (np.ndarray): datetime64[D] dates of the price bars.
+        close (np.ndarray): float close prices.
+        trends (list[(np.ndarray, np.ndarray)]): (dates, volumes) per keyword, e.g. from parse_trends.
+        months_window (int): months back from the latest date for the "recent" correlation.
+
+    Returns:
+        (np.ndarray, np.ndarray): (long-term r, short-term r), NaN where a correlation isn't defined.
+    """
+    k, n = len(trends), len(price_dates)
+    long_r = np.full(k, np.nan)
+    short_r = np.full(k, np.nan)
+    rows = [i for i, (dates, _) in enumerate(trends) if len(dates) > 0]
+    if n == 0 or not rows:
+        return long_r, short_r
+
+    aligned_dates = np.empty((len(rows), n), dtype="datetime64[D]")
+    volumes = np.empty((len(rows), n), dtype=float)
+    for j, i in enumerate(rows):
+        dates, values = trends[i]
+        aligned_dates[j], volumes[j] = align_to_nearest_dates(price_dates, dates, values.astype(float))
+
+    latest = pd.DatetimeIndex(aligned_dates.max(axis=1))
+    cutoff = (latest - pd.DateOffset(months=months_window)).to_numpy().astype("datetime64[D]")
+    recent = aligned_dates >= cutoff[:, None]
+
+    long_r[rows] = masked_pearson(close, volumes)
+    short_r[rows] = masked_pearson(close, volumes, recent)
+    return long_r, short_r
+
+
+def _round_corr(r):
+    return None if np.isnan(r) else round(float(r), 2)
+
+
 def get_corr_companies(data, price_data, months_window=2):
     """
     data: {'keywords': [{'keyword','type','trend': 'MM/DD/YYYY: 1,234, ...'}, ...]}
     price_data: iterable with at least ['date','close']
     months_window: months back from max date for the "recent" correlation
     """
-    df_price_base = pd.DataFrame(price_data).copy()
-    df_price_base["date"] = pd.to_datetime(df_price_base["date"])
-    df_price_base = df_price_base.set_index("date").sort_index()
+    df_price = pd.DataFrame(price_data)
+    price_dates = to_day_array(df_price["date"])
+    close = pd.to_numeric(df_price["close"], errors="coerce").to_numpy(dtype=float)
 
-    results = []
+    keywords = data.get('keywords', [])
+    trends = parse_trends([kw_dict.get('trend', '') for kw_dict in keywords])
+    long_r, short_r = batch_corr_companies(price_dates, close, trends, months_window)
 
-    for kw_dict in data.get('keywords', []):
+    results = []
+    for kw_dict, corr_all, corr_3m in zip(keywords, long_r, short_r):
         dtype = kw_dict.get('type', '')
         prefix = "#" if dtype == "Tiktok" else ""
-        kw_label = f"{prefix}{kw_dict.get('keyword','')} ({dtype})"
-
-        trend_str = kw_dict.get('trend', '') or ''
-        pairs = [p.strip() for p in trend_str.split(",") if p.strip()]
-        trend = []
-        for item in pairs:
-            if ":" not in item:
-                continue
-            dpart, vpart = item.split(":", 1)
-            try:
-                d = datetime.strptime(dpart.strip(), "%m/%d/%Y")
-                v = int(vpart.strip().replace(",", ""))
-                trend.append((d, v))
-            except Exception:
-                continue
-
-        if not trend:
-            results.append({
-                "label": kw_label, "keyword": kw_dict.get('keyword'), "type": dtype,
-                "Long-term Correlation": None, "Short-term Correlation": None
-            })
-            continue
+        results.append({
+            "label": f"{prefix}{kw_dict.get('keyword','')} ({dtype})",
+            "keyword": kw_dict.get('keyword'),
+            "type": dtype,
+            "Long-term Correlation": _round_corr(corr_all),
+            "Short-term Correlation": _round_corr(corr_3m)
+        })
 
-        df_trend = pd.DataFrame(trend, columns=["date", "trend_volume"]).set_index("date").sort_index()
+    return results
 
-        # Your custom aligner
-        aligned_price = adjust_to_nearest_dates(df_price_base, df_trend)
 
-        # Join & clean
-        df_combined = aligned_price.join(df_trend, how="inner")
-        if df_combined.empty:
-            results.append({
-                "label": kw_label, "keyword": kw_dict.get('keyword'), "type": dtype,
-                "Long-term Correlation": None, "Short-term Correlation": None
-            })
-            continue
+# ------------------------------------- lead/lag cross-correlation between trends and prices --------------------------
+def _xcorr_sums(a, b, max_lag, nfft):
+    """sum_t a[t] * b[t + lag] for every row and every lag in -max_lag..max_lag, via one FFT per input."""
+    full = np.fft.irfft(np.conj(np.fft.rfft(a, nfft)) * np.fft.rfft(b, nfft), nfft)
+    return np.concatenate([full[..., nfft - max_lag:], full[..., :max_lag + 1]], axis=-1)
 
-        # Coerce numeric & drop infs early
-        for col in ("close", "trend_volume"):
-            df_combined[col] = pd.to_numeric(df_combined[col], errors="coerce")
-        df_combined = df_combined.replace([np.inf, -np.inf], np.nan)
 
-        # Overall correlation (safe)
-        corr_all = safe_corr(df_combined["close"], df_combined["trend_volume"])
+def lagged_corr(x, y, max_lag=12, min_periods=8):
+    """
+    Pearson r between x[t] and y[t + lag] for every lag in -max_lag..max_lag, for every row at once.
 
-        # Recent window correlation (safe)
-        cutoff = df_combined.index.max() - pd.DateOffset(months=months_window)
-        df_last = df_combined[df_combined.index >= cutoff]
-        corr_3m = safe_corr(df_last["close"], df_last["trend_volume"]) if not df_last.empty else None
+    Positive lags mean x leads y. NaN marks missing points; each lag only uses points where both sides exist.
+    All the windowed sums come from FFT cross-correlations, so the cost is O(n log n) per row regardless of
+    the number of lags.
 
-        results.append({
-            "label": kw_label,
-            "keyword": kw_dict.get('keyword'),
-            "type": dtype,
-            "Long-term Correlation": corr_all,
-            "Short-term Correlation": corr_3m
-        })
+    Args:
+        x (np.ndarray): (n,) or (p, n) values on a regular grid.
+        y (np.ndarray): (n,) or (p, n) values on the same grid.
+        max_lag (int): largest lead/lag (in grid steps) to evaluate.
+        min_periods (int): lags with fewer overlapping points than this come back as NaN.
+
+    Returns:
+        (np.ndarray, np.ndarray): (lags, r) with r shaped (p, 2 * max_lag + 1).
+    """
+    x, y = np.broadcast_arrays(np.atleast_2d(np.asarray(x, dtype=float)), np.atleast_2d(np.asarray(y, dtype=float)))
+    lags = np.arange(-max_lag, max_lag + 1)
+    n = x.shape[-1]
+    if n == 0:
+        return lags, np.full(x.shape[:-1] + (len(lags),), np.nan)
+
+    mask_x, mask_y = np.isfinite(x), np.isfinite(y)
+
+    # standardise each row first so the FFT sums stay well conditioned
+    def standardise(v, mask):
+        count = np.maximum(mask.sum(axis=-1, keepdims=True), 1)
+        v = np.where(mask, v, 0.0)
+        mean = v.sum(axis=-1, keepdims=True) / count
+        v = np.where(mask, v - mean, 0.0)
+        std = np.sqrt((v * v).sum(axis=-1, keepdims=True) / count)
+        return v / np.where(std > 0, std, 1.0)
+
+    x, y = standardise(x, mask_x), standardise(y, mask_y)
+    mask_x, mask_y = mask_x.astype(float), mask_y.astype(float)
+
+    nfft = 1 << int(np.ceil(np.log2(n + max_lag + 1)))
+    count = np.rint(_xcorr_sums(mask_x, mask_y, max_lag, nfft))
+    sum_x = _xcorr_sums(x, mask_y, max_lag, nfft)
+    sum_y = _xcorr_sums(mask_x, y, max_lag, nfft)
+    sum_xx = _xcorr_sums(x * x, mask_y, max_lag, nfft)
+    sum_yy = _xcorr_sums(mask_x, y * y, max_lag, nfft)
+    sum_xy = _xcorr_sums(x, y, max_lag, nfft)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        var_x = sum_xx - sum_x ** 2 / count
+        var_y = sum_yy - sum_y ** 2 / count
+        r = (sum_xy - sum_x * sum_y / count) / np.sqrt(var_x * var_y)
+
+    bad = (count < max(min_periods, 2)) | (var_x <= 1e-9 * count) | (var_y <= 1e-9 * count)
+    return lags, np.where(bad, np.nan, np.clip(r, -1.0, 1.0))
+
+
+def _weekly_grid(series):
+    starts = [dates.min() for dates, _ in series if len(dates)]
+    ends = [dates.max() for dates, _ in series if len(dates)]
+    if not starts:
+        return np.empty(0, dtype="datetime64[D]")
+    first = snap_to_week_end(np.array([min(starts)], dtype="datetime64[D]"))[0]
+    last = snap_to_week_end(np.array([max(ends)], dtype="datetime64[D]"))[0]
+    return np.arange(first, last + 1, 7)
+
+
+def _monthly_grid(series):
+    starts = [dates.min() for dates, _ in series if len(dates)]
+    ends = [dates.max() for dates, _ in series if len(dates)]
+    if not starts:
+        return np.empty(0, dtype="datetime64[D]")
+    months = np.arange(np.datetime64(min(starts), "M"), np.datetime64(max(ends), "M") + 1)
+    return snap_to_month_end(months)
+
+
+def _on_grid(grid, dates, values, snap=snap_to_week_end):
+    # last value of each week (month with snap_to_month_end), as-of aligned onto the grid and blanked outside the
+    # series' own span
+    if len(dates) == 0 or len(grid) == 0:
+        return np.full(len(grid), np.nan)
+    period_ends = snap(dates)
+    _, out = align_to_nearest_dates(grid, period_ends[::-1], np.asarray(values, dtype=float)[::-1])
+    out[(grid < period_ends.min()) | (grid > period_ends.max())] = np.nan
+    return out
+
+
+def _is_monthly(dates):
+    # one point per month, like the kw_joined 'trend' column
+    return len(dates) > 1 and np.median(np.diff(dates).astype(int)) >= 28
+
+
+def lead_lag_profiles(trend_series, price_series, max_lag=12):
+    """
+    Weekly lead/lag correlation profiles for trend/price pairs.
+
+    Both lists hold (dates, values) pairs and are paired element-wise; a list of length 1 is broadcast against
+    the other. Weekly and daily trends are put on one weekly (Sunday) grid with their prices and correlated with
+    lagged_corr in a single pass. Monthly trends are correlated with month-end closes on a monthly grid instead, as
+    nearest-filling them onto weeks would smear the best lag by up to two weeks either way; their lags are whole
+    months, reported at the nearest week and NaN at the weeks in between.
+
+    Args:
+        trend_series (list[(np.ndarray, np.ndarray)]): trend (dates, volumes).
+        price_series (list[(np.ndarray, np.ndarray)]): price (dates, closes).
+        max_lag (int): largest lead/lag in weeks.
+
+    Returns:
+        (np.ndarray, np.ndarray): (lags in weeks, r shaped (pairs, 2 * max_lag + 1)); positive lag = trend leads.
+    """
+    trend_series, price_series = list(trend_series), list(price_series)
+    lags = np.arange(-max_lag, max_lag + 1)
+    n_pairs = max(len(trend_series), len(price_series))
+    r = np.full((n_pairs, len(lags)), np.nan)
+    if len(trend_series) == 1:
+        monthly = np.full(n_pairs, _is_monthly(trend_series[0][0]))
+    else:
+        monthly = np.array([_is_monthly(dates) for dates, _ in trend_series], dtype=bool).reshape(n_pairs)
+
+    for in_group, make_grid, snap, weeks_per_step in ((~monthly, _weekly_grid, snap_to_week_end, 1),
+                                                      (monthly, _monthly_grid, snap_to_month_end, 52 / 12)):
+        rows = np.flatnonzero(in_group)
+        if len(rows) == 0:
+            continue
+        trends = [trend_series[i] for i in rows] if len(trend_series) > 1 else trend_series
+        prices = [price_series[i] for i in rows] if len(price_series) > 1 else price_series
+        grid = make_grid(trends + prices)
+        if len(grid) == 0:
+            continue
+        x = np.array([_on_grid(grid, dates, values, snap) for dates, values in trends]).reshape(-1, len(grid))
+        y = np.array([_on_grid(grid, dates, values, snap) for dates, values in prices]).reshape(-1, len(grid))
+        # only the grid lags that stay within max_lag weeks
+        grid_lags, grid_r = lagged_corr(x, y, max_lag=int(max_lag / weeks_per_step))
+        columns = max_lag + np.rint(grid_lags * weeks_per_step).astype(int)
+        r[np.ix_(rows, columns)] = np.broadcast_to(grid_r, (len(rows), len(columns)))
+    return lags, r
+
+
+def summarise_lead_lag(lags, r):
+    """
+    Reduce lag profiles to the lag with the strongest (absolute) correlation.
 
+    Returns:
+        list[dict]: one {'Best Lag (weeks)', 'Lag Correlation', 'Lag Profile'} dict per profile row.
+    """
+    results = []
+    for row in r:
+        if np.isnan(row).all():
+            best_lag, best_r = None, None
+        else:
+            best = int(np.nanargmax(np.abs(row)))
+            best_lag, best_r = int(lags[best]), _round_corr(row[best])
+        results.append({'Best Lag (weeks)': best_lag, 'Lag Correlation': best_r,
+                        'Lag Profile': [_round_corr(v) for v in row]})
     return results
 
 
+def lag_profile_chart_data(results, names):
+    """
+    Turn summarise_lead_lag results into (data, series) for a dmc.LineChart keyed on "lag".
+
+    Args:
+        results (list[dict]): dicts with a 'Lag Profile' list, all covering the same -max_lag..max_lag range.
+        names (list[str]): series name for each result.
+    """
+    colours = ["orange.6", "indigo.6", "teal.6", "grape.6", "blue.6", "red.6", "lime.6", "cyan.6"]
+    if not results:
+        return [], []
+    max_lag = len(results[0]['Lag Profile']) // 2
+    data = [{"lag": lag, **{name: res['Lag Profile'][i] for name, res in zip(names, results)}}
+            for i, lag in enumerate(range(-max_lag, max_lag + 1))]
+    series = [{"name": name, "color": colours[i % len(colours)]} for i, name in enumerate(names)]
+    return data, series
+
+
+def get_lead_lag(trend, price_data, max_lag=12):
+    """
+    Lead/lag profile between a keyword's trend and every related ticker (trend page).
+
+    price_data: [{'ticker', 'code', 'date': [...], 'close': [...]}, ...] as in price-data-store
+    """
+    if not price_data:
+        return []
+    price_series = [(to_day_array(p["date"]), pd.to_numeric(pd.Series(p["close"]), errors="coerce").to_numpy())
+                    for p in price_data]
+    lags, r = lead_lag_profiles([get_trend_series(trend)], price_series, max_lag)
+    return [{'ticker': p['ticker'], 'code': p['code'], **summary}
+            for p, summary in zip(price_data, summarise_lead_lag(lags, r))]
+
+
+def get_lead_lag_companies(data, price_data, max_lag=12):
+    """
+    Lead/lag profile between every keyword of a company and its price (company page).
+
+    data: {'keywords': [{'keyword','type','trend': 'MM/DD/YYYY: 1,234, ...'}, ...]}
+    price_data: iterable with at least ['date','close']
+    """
+    keywords = data.get('keywords', [])
+    if not keywords:
+        return []
+    df_price = pd.DataFrame(price_data)
+    price_series = [(to_day_array(df_price["date"]), pd.to_numeric(df_price["close"], errors="coerce").to_numpy())]
+    trends = parse_trends([kw_dict.get('trend', '') for kw_dict in keywords])
+    lags, r = lead_lag_profiles(trends, price_series, max_lag)
+    return [{'keyword': kw_dict.get('keyword'), 'type': kw_dict.get('type', ''), **summary}
+            for kw_dict, summary in zip(keywords, summarise_lead_lag(lags, r))]
+
+
+# ------------------------------------- rolling correlation with running sums -----------------------------------------
+def rolling_corr(x, y, window=13, min_periods=None):
+    """
+    Pearson r of x and y over a trailing window ending at every point, in O(n) from running sums.
+
+    Args:
+        x (np.ndarray): (n,) values, NaN = missing.
+        y (np.ndarray): (n,) values on the same grid, NaN = missing.
+        window (int): number of grid steps in each window.
+        min_periods (int): windows with fewer valid pairs come back as NaN (defaults to half the window).
+
+    Returns:
+        np.ndarray: (n,) rolling correlations.
+    """
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    min_periods = max(min_periods or (window + 1) // 2, 2)
+    valid = np.isfinite(x) & np.isfinite(y)
+
+    # a global shift/scale leaves every window's r unchanged and keeps the running sums well conditioned
+    def standardise(v):
+        v = np.where(valid, v, 0.0)
+        if valid.any():
+            v = np.where(valid, v - v[valid].mean(), 0.0)
+            std = v[valid].std()
+            v = v / std if std > 0 else v
+        return v
+
+    x, y = standardise(x), standardise(y)
+
+    def window_sum(v):
+        cs = np.concatenate(([0.0], np.cumsum(v)))
+        end = np.arange(1, len(v) + 1)
+        return cs[end] - cs[np.maximum(end - window, 0)]
+
+    count = window_sum(valid.astype(float))
+    sum_x, sum_y = window_sum(x), window_sum(y)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        var_x = window_sum(x * x) - sum_x ** 2 / count
+        var_y = window_sum(y * y) - sum_y ** 2 / count
+        r = (window_sum(x * y) - sum_x * sum_y / count) / np.sqrt(var_x * var_y)
+
+    bad = (count < min_periods) | (var_x <= 1e-9 * count) | (var_y <= 1e-9 * count)
+    return np.where(bad, np.nan, np.clip(r, -1.0, 1.0))
+
+
+class RollingCorrCache:
+    """
+    LRU cache of rolling correlation series per keyword/ticker pair.
+
+    On a repeat request only the tail after the first changed point is recomputed (using the `window` points
+    before it), so a weekly refresh that appends a point reuses every earlier value.
+    """
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, dates, x, y, window):
+        with self._lock:
+            cached = self._entries.get((key, window))
+            if cached is not None:
+                self._entries.move_to_end((key, window))
+
+        start = 0
+        if cached is not None:
+            old_dates, old_x, old_y, old_r = cached
+            m = min(len(old_dates), len(dates))
+            same = ((old_dates[:m] == dates[:m])
+                    & ((old_x[:m] == x[:m]) | (np.isnan(old_x[:m]) & np.isnan(x[:m])))
+                    & ((old_y[:m] == y[:m]) | (np.isnan(old_y[:m]) & np.isnan(y[:m]))))
+            start = m if same.all() else int(np.argmin(same))
+
+        if cached is not None and start == len(dates) == len(cached[0]):
+            return cached[3]
+
+        tail_from = max(start - window + 1, 0)
+        tail = rolling_corr(x[tail_from:], y[tail_from:], window)[start - tail_from:]
+        r = np.concatenate((cached[3][:start], tail)) if start else tail
+
+        with self._lock:
+            self._entries[(key, window)] = (dates, x, y, r)
+            self._entries.move_to_end((key, window))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return r
+
+
+rolling_corr_cache = RollingCorrCache()
+
+
+def get_rolling_corr(trend_series, price_series, window=13, key=None):
+    """
+    Rolling weekly correlation between one trend and one price series.
+
+    Args:
+        trend_series (tuple): trend (dates, volumes).
+        price_series (tuple): price (dates, closes).
+        window (int): window in weeks (13 ~ 3 months).
+        key (hashable): pair identifier; when given, the result is cached and only the tail is recomputed later.
+
+    Returns:
+        (np.ndarray, np.ndarray): (weekly grid as datetime64[D], rolling r)
+    """
+    grid = _weekly_grid([trend_series, price_series])
+    x = _on_grid(grid, *trend_series)
+    y = _on_grid(grid, *price_series)
+    if key is None:
+        return grid, rolling_corr(x, y, window)
+    return grid, rolling_corr_cache.get(key, grid, x, y, window)
+
+
+def rolling_corr_chart_data(grid, r):
+    """(grid, r) -> list of {'date', 'correlation'} dicts for a dmc.LineChart, dropping leading empty windows."""
+    valid = np.flatnonzero(~np.isnan(r))
+    if len(valid) == 0:
+        return []
+    grid, r = grid[valid[0]:], r[valid[0]:]
+    return [{"date": str(d), "correlation": None if np.isnan(v) else round(float(v), 2)}
+            for d, v in zip(grid, r)]
+
+
 def merge_dict_lists(list1, list2):
     # index list2 by (ticker, code)
     index = {(d['ticker'], d['code']): d for d in list2}
@@ -0,0 +1,276 @@
+import os
+import json
+import time
+import sqlite3
+import tempfile
+from contextlib import contextmanager, closing
+import numpy as np
+from utils.helpers import parse_trends
+
+# The discover pages list many trends / companies at once but only render a few fields and a small chart of each.
+# jobs/build_list_views.py writes exactly that (lean rows with pre-downsampled series) to a local summary store; the
+# pages read it and fall back to a lean kw_joined / kw_companies query when it is missing or older than
+# LIST_VIEW_MAX_AGE, so a new or edited row is listed at most that long after it lands upstream. Schedule the job at
+# least that often, and right after every kw_joined / kw_companies update.
+LIST_VIEW_PATH = os.getenv("LIST_VIEW_PATH", os.path.join("cache", "list_views.sqlite"))
+LIST_VIEW_MAX_AGE = int(os.getenv("LIST_VIEW_MAX_AGE", 3600))  # seconds
+CARD_POINTS = int(os.getenv("CARD_POINTS", 60))  # points per discover-trends card chart
+SPARKLINE_POINTS = int(os.getenv("SPARKLINE_POINTS", 40))  # points per discover-companies sparkline
+
+TREND_COLUMNS = {"Long Term": "trend", "Short Term": "trend_st"}  # kw_joined series shown for each period
+TREND_LIST_COLUMNS = "keyword, type, volume, yoy, categories, tickers"
+COMPANY_LIST_COLUMNS = "ticker, code, full_name, exchange, country, avg_yoy, avg_volume, keywords"
+
+# sort option -> (column, descending)
+TREND_SORTS = {
+    "YoY Growth Ascending": ("yoy", False),
+    "YoY Growth Descending": ("yoy", True),
+    "Volume/Views Ascending": ("volume", False),
+    "Volume/Views Descending": ("volume", True),
+    "Alphabetically Ascending": ("keyword", False),
+    "Alphabetically Descending": ("keyword", True),
+}
+COMPANY_SORTS = {
+    "YoY Growth Ascending": ("avg_yoy", False),
+    "YoY Growth Descending": ("avg_yoy", True),
+    "Volume/Views Ascending": ("avg_volume", False),
+    "Volume/Views Descending": ("avg_volume", True),
+    "Alphabetically Ascending": ("ticker", False),
+    "Alphabetically Descending": ("ticker", True),
+}
+# sort columns holding text: SQLite compares them byte-wise (BINARY) unless told otherwise
+_TEXT_SORT_COLUMNS = {"keyword", "ticker"}
+
+_SCHEMA = """
+CREATE TABLE trend_cards (
+    keyword TEXT, type TEXT, categories TEXT, volume REAL, yoy REAL,
+    card TEXT NOT NULL
+);
+CREATE TABLE company_rows (
+    ticker TEXT, country TEXT, avg_yoy REAL, avg_volume REAL,
+    row TEXT NOT NULL
+);
+CREATE TABLE meta (
+    name TEXT PRIMARY KEY,
+    value REAL NOT NULL
+);
+"""
+
+
+# ------------------------------------------------ downsampled series -------------------------------------------------
+def downsample(dates, values, max_points):
+    """
+    Keep at most `max_points` evenly spaced points.
+
+    Plain decimation rather than averaging: the points kept are real observations, and the first and latest ones
+    (where a card joins its projection) are always among them.
+
+    Args:
+        dates (np.ndarray): datetime64[D] dates, oldest first.
+        values (np.ndarray): values for those dates.
+        max_points (int): size of the result.
+
+    Returns:
+        (np.ndarray, np.ndarray): (dates, values)
+    """
+    n = len(values)
+    if n <= max_points:
+        return dates, values
+    keep = np.unique(np.linspace(0, n - 1, max_points).round().astype(np.int64))
+    return dates[keep], values[keep]
+
+
+def series_payload(dates, values, max_points):
+    """A downsampled series as JSON-ready lists: {'date': ['YYYY-MM-DD', ...], 'value': [int, ...]}."""
+    dates, values = downsample(dates, values, max_points)
+    return {'date': np.datetime_as_string(dates, unit="D").tolist(), 'value': values.tolist()}
+
+
+def series_arrays(series):
+    """Inverse of series_payload: (dates as datetime64[D], values as int64)."""
+    series = series or {'date': [], 'value': []}
+    return np.array(series['date'], dtype="datetime64[D]"), np.array(series['value'], dtype=np.int64)
+
+
+# ------------------------------------------------- lean list rows ----------------------------------------------------
+def trend_cards(rows, periods=tuple(TREND_COLUMNS)):
+    """
+    Lean discover-trends cards from kw_joined rows.
+
+    Args:
+        rows (list[dict]): kw_joined rows with TREND_LIST_COLUMNS and the trend columns of `periods`
+            (plus trend_projected for 'Long Term').
+        periods (tuple[str]): periods to include series for.
+
+    Returns:
+        list[dict]: {'keyword', 'type', 'volume', 'yoy', 'categories', 'tickers': [{'ticker', 'code'}],
+        'series': {period: series_payload}, 'projected': series_payload or None}
+    """
+    parsed = {period: parse_trends([row.get(TREND_COLUMNS[period]) for row in rows]) for period in periods}
+    projected = parse_trends([row.get('trend_projected') for row in rows]) if "Long Term" in periods else None
+
+    cards = []
+    for i, row in enumerate(rows):
+        cards.append({
+            'keyword': row['keyword'],
+            'type': row['type'],
+            'volume': row['volume'],
+            'yoy': row['yoy'],
+            'categories': row['categories'],
+            'tickers': [{'ticker': item['ticker'], 'code': item['code']} for item in row['tickers'] or []],
+            'series': {period: series_payload(*parsed[period][i], CARD_POINTS) for period in periods},
+            'projected': series_payload(*projected[i], CARD_POINTS) if projected and len(projected[i][0]) else None,
+        })
+    return cards
+
+
+def company_rows(rows):
+    """
+    Lean discover-companies rows from kw_companies rows.
+
+    Args:
+        rows (list[dict]): kw_companies rows with COMPANY_LIST_COLUMNS.
+
+    Returns:
+        list[dict]: the company fields the list shows, with 'keywords' cut down to
+        [{'keyword', 'type', 'impact', 'direction', 'sparkline': [int, ...]}].
+    """
+    keywords = [keyword for row in rows for keyword in row['keywords'] or []]
+    trends = iter(parse_trends([keyword.get('trend') for keyword in keywords]))
+
+    lean_rows = []
+    for row in rows:
+        lean_keywords = []
+        for keyword in row['keywords'] or []:
+            _, values = downsample(*next(trends), SPARKLINE_POINTS)
+            lean_keywords.append({
+                'keyword': keyword['keyword'],
+                'type': keyword['type'],
+                'impact': keyword.get('impact'),
+                'direction': keyword.get('direction'),
+                'sparkline': values.tolist(),
+            })
+        lean_rows.append({**{key: row.get(key) for key in COMPANY_LIST_COLUMNS.split(", ")}, 'keywords': lean_keywords})
+    return lean_rows
+
+
+def card_for_period(card, period):
+    """A stored card reduced to what one period renders: its series under 'series' and the projection (Long Term)."""
+    series = card['series'].get(period) or card['series'].get("Long Term")
+    return {**card, 'series': series, 'projected': card['projected'] if period == "Long Term" else None}
+
+
+# ---------------------------------------------- summary store (write) ------------------------------------------------
+def write_list_views(cards, companies, path=None):
+    """
+    Replace the summary store with new list rows.
+
+    The store is built in a temporary file and swapped in with os.replace, so readers see either the old or the new
+    store, never a partial one.
+
+    Args:
+        cards (list[dict]): trend_cards(...) for every kw_joined row.
+        companies (list[dict]): company_rows(...) for every kw_companies row.
+        path (str): store path, LIST_VIEW_PATH by default.
+    """
+    path = path or LIST_VIEW_PATH
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    os.close(fd)
+    try:
+        with closing(sqlite3.connect(tmp_path)) as conn:
+            conn.executescript(_SCHEMA)
+            conn.executemany(
+                "INSERT INTO trend_cards VALUES (?, ?, ?, ?, ?, ?)",
+                [(c['keyword'], c['type'], c['categories'], c['volume'], c['yoy'], json.dumps(c)) for c in cards],
+            )
+            conn.executemany(
+                "INSERT INTO company_rows VALUES (?, ?, ?, ?, ?)",
+                [(r['ticker'], r['country'], r['avg_yoy'], r['avg_volume'], json.dumps(r)) for r in companies],
+            )
+            conn.execute("INSERT INTO meta VALUES ('built_at', ?)", (time.time(),))
+            conn.commit()
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+# ----------------------------------------------- summary store (read) ------------------------------------------------
+@contextmanager
+def _connect_fresh(path=None, max_age=None):
+    # yields a read-only connection, or None when there is no store younger than max_age
+    path = path or LIST_VIEW_PATH
+    max_age = LIST_VIEW_MAX_AGE if max_age is None else max_age
+    try:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    except sqlite3.OperationalError:
+        yield None
+        return
+    try:
+        try:
+            built_at = conn.execute("SELECT value FROM meta WHERE name = 'built_at'").fetchone()
+        except sqlite3.DatabaseError:  # not a store (yet)
+            built_at = None
+        yield conn if built_at and time.time() - built_at[0] < max_age else None
+    finally:
+        conn.close()
+
+
+def _order_by(sorts, sort):
+    # PostgREST order semantics, so the store and the live query list rows the same way: NULLs count as the largest,
+    # and text sorts ignore case like the database's locale collation does ('apple' next to 'Apple', not after 'Zoo')
+    if sort not in sorts:
+        return "rowid"
+    column, desc = sorts[sort]
+    if column in _TEXT_SORT_COLUMNS:
+        column = f"{column} COLLATE NOCASE"
+    return f"{column} DESC NULLS FIRST, rowid" if desc else f"{column} ASC NULLS LAST, rowid"
+
+
+def query_trend_cards(period, category=None, source=None, sort=None, start=0, end=8, path=None):
+    """
+    One page of discover-trends cards from the summary store.
+
+    Filters and sorting match the kw_joined query of generate_cards (case-insensitive substring filters,
+    TREND_SORTS); start/end are 0-based and inclusive like Supabase's .range().
+
+    Returns:
+        list[dict] | None: card_for_period(...) cards, or None when the store is missing or stale.
+    """
+    where, params = [], []
+    if category:
+        where.append("categories LIKE ?")
+        params.append(f"%{category.strip()}%")
+    if source:
+        where.append("type LIKE ?")
+        params.append(f"%{source.strip()}%")
+    sql = (f"SELECT card FROM trend_cards {'WHERE ' + ' AND '.join(where) if where else ''} "
+           f"ORDER BY {_order_by(TREND_SORTS, sort)} LIMIT ? OFFSET ?")
+
+    with _connect_fresh(path) as conn:
+        if conn is None:
+            return None
+        rows = conn.execute(sql, (*params, max(0, end - start + 1), start)).fetchall()
+    return [card_for_period(json.loads(card), period) for card, in rows]
+
+
+def query_company_rows(country=None, sort=None, start=0, end=3, path=None):
+    """
+    One page of discover-companies rows from the summary store, filtered and sorted like generate_groups' kw_companies
+    query (COMPANY_SORTS); start/end are 0-based and inclusive.
+
+    Returns:
+        list[dict] | None: company_rows(...) rows, or None when the store is missing or stale.
+    """
+    where, params = "", []
+    if country:
+        where = "WHERE country LIKE ?"
+        params.append(f"%{country}%")
+    sql = f"SELECT row FROM company_rows {where} ORDER BY {_order_by(COMPANY_SORTS, sort)} LIMIT ? OFFSET ?"
+
+    with _connect_fresh(path) as conn:
+        if conn is None:
+            return None
+        rows = conn.execute(sql, (*params, max(0, end - start + 1), start)).fetchall()
+    return [json.loads(row) for row, in rows]
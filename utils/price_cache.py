@@ -0,0 +1,423 @@
+import os
+import sqlite3
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import date, timedelta
+import pandas as pd
+from utils.EODHD_functions import get_historical_stock_data, EODHDError
+from utils.yfinance_functions import YFinanceError
+from utils.single_flight import single_flight
+
+# Daily bars (EODHD and yfinance) are stored locally so page views only ask for dates we don't have yet
+PRICE_CACHE_PATH = os.getenv("PRICE_CACHE_PATH", os.path.join("cache", "prices.sqlite"))
+# A stored history is current once it reaches the last completed trading day (jobs/refresh_eod.py brings every EODHD
+# ticker there nightly); one that is behind has its tail fetched live, at most once per PRICE_CACHE_TTL seconds
+PRICE_CACHE_TTL = int(os.getenv("PRICE_CACHE_TTL", 3600))
+PRICE_COLUMNS = ("open", "high", "low", "close", "adjusted_close", "volume")
+PRICE_FETCH_ERRORS = (EODHDError, YFinanceError)
+
+# Daily bars are rolled up into weekly and monthly bars whenever they're stored, so charts never resample.
+# level -> (table, SQL expression for the period a bar belongs to); bars are dated at the end of their period (Sunday /
+# last day of the month), like the weekly and monthly trend series
+PRICE_LEVELS = {
+    "daily": ("bars", "date"),
+    "weekly": ("bars_weekly", "date(date, 'weekday 0')"),
+    "monthly": ("bars_monthly", "date(date, 'start of month', '+1 month', '-1 day')"),
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS bars (
+    ticker TEXT NOT NULL,
+    date TEXT NOT NULL,
+    open REAL, high REAL, low REAL, close REAL, adjusted_close REAL, volume REAL,
+    PRIMARY KEY (ticker, date)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS bars_weekly (
+    ticker TEXT NOT NULL,
+    date TEXT NOT NULL,
+    open REAL, high REAL, low REAL, close REAL, adjusted_close REAL, volume REAL,
+    PRIMARY KEY (ticker, date)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS bars_monthly (
+    ticker TEXT NOT NULL,
+    date TEXT NOT NULL,
+    open REAL, high REAL, low REAL, close REAL, adjusted_close REAL, volume REAL,
+    PRIMARY KEY (ticker, date)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS coverage (
+    ticker TEXT PRIMARY KEY,
+    covered_from TEXT NOT NULL,
+    covered_to TEXT NOT NULL,
+    fetched_at REAL NOT NULL
+);
+"""
+
+
+@contextmanager
+def _connect(path=None):
+    path = path or PRICE_CACHE_PATH
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+        yield conn
+        conn.commit()
+    finally:
+        conn.close()
+
+
+# ------------------------------------------- read / write the local store --------------------------------------------
+def store_bars(conn, ticker, df):
+    """Upsert daily bars (a frame shaped like the EODHD eod response) for one ticker."""
+    if df is None or len(df) == 0:
+        return
+    df = df.copy()
+    df["date"] = pd.to_datetime(df["date"]).dt.strftime("%Y-%m-%d")
+    for col in PRICE_COLUMNS:
+        if col not in df.columns:
+            df[col] = None
+    rows = df[["date", *PRICE_COLUMNS]].astype(object).where(df[["date", *PRICE_COLUMNS]].notna(), None)
+    conn.executemany(
+        f"INSERT OR REPLACE INTO bars (ticker, date, {', '.join(PRICE_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        [(ticker, *row) for row in rows.itertuples(index=False, name=None)],
+    )
+    build_levels(conn, ticker, df["date"].min(), df["date"].max())
+
+
+def load_bars(conn, ticker, from_date, to_date, level="daily"):
+    """
+    Stored bars for ticker between from_date and to_date (inclusive, 'YYYY-MM-DD'), oldest first.
+
+    Args:
+        level (str): 'daily', 'weekly' or 'monthly' (see PRICE_LEVELS).
+    """
+    table, _ = PRICE_LEVELS[level]
+    if level != "daily":
+        to_date = _period_span(level, to_date, to_date)[1].isoformat()  # the current period is dated at its end
+    query = f"SELECT date, {', '.join(PRICE_COLUMNS)} FROM {table} WHERE ticker = ? AND date BETWEEN ? AND ? ORDER BY date"
+    df = pd.read_sql_query(query, conn, params=(ticker, from_date, to_date))
+    if level != "daily" and df.empty and _levels_behind(conn, ticker, level):
+        # bars stored before the weekly/monthly tables existed; an empty range is otherwise normal (e.g. before a
+        # listing), so nothing is rebuilt unless the daily bars reach past the roll-ups
+        build_levels(conn, ticker)
+        df = pd.read_sql_query(query, conn, params=(ticker, from_date, to_date))
+    return df
+
+
+def _levels_behind(conn, ticker, level):
+    # True when the ticker's daily bars span periods its `level` roll-ups don't (their first / last period dates)
+    table, _ = PRICE_LEVELS[level]
+    daily_first, daily_last = conn.execute("SELECT MIN(date), MAX(date) FROM bars WHERE ticker = ?",
+                                           (ticker,)).fetchone()
+    if daily_first is None:
+        return False
+    rolled_first, rolled_last = conn.execute(f"SELECT MIN(date), MAX(date) FROM {table} WHERE ticker = ?",
+                                             (ticker,)).fetchone()
+    return (rolled_first is None
+            or rolled_first > _period_span(level, daily_first, daily_first)[1].isoformat()
+            or rolled_last < _period_span(level, daily_last, daily_last)[1].isoformat())
+
+
+# ------------------------------------------- weekly / monthly roll-ups -----------------------------------------------
+def _period_span(level, first, last):
+    # every daily bar in the periods touched by [first, last]
+    first, last = date.fromisoformat(first), date.fromisoformat(last)
+    if level == "weekly":
+        return first - timedelta(days=first.weekday()), last + timedelta(days=6 - last.weekday())
+    next_month = (last.replace(day=1) + timedelta(days=32)).replace(day=1)
+    return first.replace(day=1), next_month - timedelta(days=1)
+
+
+def build_levels(conn, ticker, first=None, last=None):
+    """
+    Recompute the weekly and monthly bars of the periods that daily bars between first and last fall in.
+
+    Only the touched periods are rebuilt, so appending a day rewrites one week and one month. Open is the period's
+    first open, close / adjusted_close its last, high / low the extremes and volume the sum, as in get_weekly_data.
+
+    Args:
+        conn (sqlite3.Connection): price cache connection.
+        ticker (str): store key.
+        first (str): 'YYYY-MM-DD' of the earliest changed bar (default: the ticker's first bar).
+        last (str): 'YYYY-MM-DD' of the latest changed bar (default: the ticker's last bar).
+    """
+    if first is None or last is None:
+        first, last = conn.execute("SELECT MIN(date), MAX(date) FROM bars WHERE ticker = ?", (ticker,)).fetchone()
+        if first is None:
+            return
+
+    for level in ("weekly", "monthly"):
+        table, period = PRICE_LEVELS[level]
+        span_start, span_end = _period_span(level, first, last)
+        conn.execute(
+            f"""
+            WITH daily AS (
+                SELECT date, open, high, low, close, adjusted_close, volume, {period} AS period
+                FROM bars WHERE ticker = :ticker AND date BETWEEN :span_start AND :span_end
+            ), ranked AS (
+                SELECT period, high, low, volume,
+                       FIRST_VALUE(open) OVER (PARTITION BY period ORDER BY open IS NULL, date) AS first_open,
+                       FIRST_VALUE(close) OVER (PARTITION BY period ORDER BY close IS NULL, date DESC) AS last_close,
+                       FIRST_VALUE(adjusted_close) OVER (PARTITION BY period
+                                                         ORDER BY adjusted_close IS NULL, date DESC) AS last_adjusted
+                FROM daily
+            )
+            INSERT OR REPLACE INTO {table} (ticker, date, {', '.join(PRICE_COLUMNS)})
+            SELECT :ticker, period, MAX(first_open), MAX(high), MIN(low), MAX(last_close), MAX(last_adjusted),
+                   SUM(volume)
+            FROM ranked GROUP BY period
+            """,
+            {"ticker": ticker, "span_start": span_start.isoformat(), "span_end": span_end.isoformat()},
+        )
+
+
+def get_coverage(conn, ticker):
+    """(covered_from, covered_to, fetched_at) for ticker, or None if it has never been fetched."""
+    return conn.execute("SELECT covered_from, covered_to, fetched_at FROM coverage WHERE ticker = ?",
+                        (ticker,)).fetchone()
+
+
+def set_coverage(conn, ticker, covered_from, covered_to, fetched_at=None):
+    conn.execute("INSERT OR REPLACE INTO coverage (ticker, covered_from, covered_to, fetched_at) VALUES (?, ?, ?, ?)",
+                 (ticker, covered_from, covered_to, time.time() if fetched_at is None else fetched_at))
+
+
+# ------------------------------------------- work out what's missing ------------------------------------------------
+def last_trading_day(today=None):
+    """
+    The latest weekday before `today`: the newest session whose end-of-day bar is final. Holidays aren't known, so
+    after one the store looks a session behind until the next bar exists (see missing_ranges' ttl).
+
+    Returns:
+        str: 'YYYY-MM-DD'
+    """
+    day = (today or date.today()) - timedelta(days=1)
+    while day.weekday() >= 5:
+        day -= timedelta(days=1)
+    return day.isoformat()
+
+
+def missing_ranges(coverage, from_date, to_date, now=None, ttl=PRICE_CACHE_TTL):
+    """
+    Date ranges that still have to be fetched to serve [from_date, to_date].
+
+    Coverage counts only final bars (see _store_delta), so the tail is needed while covered_to is behind the last
+    trading day (or to_date, if earlier). A live page view fetches it at most once per `ttl` seconds, since a holiday
+    or a halted ticker has no newer bar to find. Today's bar is never waited for: it is final after the close, when
+    the nightly bulk refresh stores it.
+
+    Returns:
+        list[(str, str)]: inclusive ('YYYY-MM-DD', 'YYYY-MM-DD') ranges.
+    """
+    if coverage is None:
+        return [(from_date, to_date)]
+
+    covered_from, covered_to, fetched_at = coverage
+    now = time.time() if now is None else now
+    ranges = []
+    if from_date < covered_from:
+        day_before = (date.fromisoformat(covered_from) - timedelta(days=1)).isoformat()
+        ranges.append((from_date, day_before))
+    needed_to = min(to_date, last_trading_day(date.fromtimestamp(now)))
+    if covered_to < needed_to and now - fetched_at > ttl:
+        ranges.append((covered_to, to_date))
+    return ranges
+
+
+def store_key(ticker, source="EODHD"):
+    """Key a ticker is stored under: EODHD symbols as-is, other providers' prefixed so symbols never collide."""
+    return ticker if source == "EODHD" else f"{source}:{ticker}"
+
+
+# ---------------------------------- bring the local store up to date for one ticker ----------------------------------
+def _store_delta(conn, key, start, end, delta):
+    # a live fetch may include today's unfinished bar: it is stored, but coverage only claims the final ones
+    store_bars(conn, key, delta)
+    current = get_coverage(conn, key)
+    end = min(end, last_trading_day())
+    covered_from = min(start, current[0]) if current else start
+    covered_to = max(end, current[1]) if current else end
+    set_coverage(conn, key, covered_from, covered_to)
+
+
+def _sync_bars(key, ticker, from_date, to_date, fetch):
+    # coverage is re-read here: under single_flight another worker may have just fetched this range
+    with _connect() as conn:
+        coverage = get_coverage(conn, key)
+
+    for start, end in missing_ranges(coverage, from_date, to_date):
+        try:
+            delta = fetch(ticker, from_date=start, to_date=end)
+        except PRICE_FETCH_ERRORS:
+            if coverage is None:
+                raise
+            continue  # serve what we already have
+        with _connect() as conn:
+            _store_delta(conn, key, start, end, delta)
+
+
+def _sync_bars_many(keys, from_date, to_date, fetch_many):
+    # one fetch_many call per distinct missing range, so cold tickers go out together and so do stale tails
+    with _connect() as conn:
+        coverage = {ticker: get_coverage(conn, key) for ticker, key in keys.items()}
+    by_range = defaultdict(list)
+    for ticker, ticker_coverage in coverage.items():
+        for date_range in missing_ranges(ticker_coverage, from_date, to_date):
+            by_range[date_range].append(ticker)
+
+    errors = {}
+    for (start, end), tickers in by_range.items():
+        deltas = fetch_many(tickers, start, end)
+        with _connect() as conn:
+            for ticker in tickers:
+                delta = deltas.get(ticker)
+                if delta is None or isinstance(delta, Exception):
+                    if coverage[ticker] is None:
+                        errors[ticker] = delta
+                    continue
+                _store_delta(conn, keys[ticker], start, end, delta)
+    return errors
+
+
+def _load(key, from_date, to_date, level="daily"):
+    with _connect() as conn:
+        df = load_bars(conn, key, from_date, to_date, level)
+    df["date"] = pd.to_datetime(df["date"])
+    return df
+
+
+def load_cached_bars(ticker, from_date, to_date, source="EODHD", level="daily"):
+    """
+    Bars already in the local store for ticker, without asking the provider for anything.
+
+    Returns:
+        pd.DataFrame | None: as get_cached_historical_stock_data, or None when the ticker's history has never been
+        fetched (the nightly bulk refresh may still have stored a stray day for it).
+    """
+    key = store_key(ticker, source)
+    with _connect() as conn:
+        coverage = get_coverage(conn, key)
+    return None if coverage is None else _load(key, from_date, to_date, level)
+
+
+# ------------------------------------- cached replacement for get_historical_stock_data ------------------------------
+def get_cached_historical_stock_data(ticker, from_date, to_date, fetch=get_historical_stock_data, source="EODHD",
+                                     level="daily"):
+    """
+    Daily bars for ticker between from_date and to_date, fetching only the missing range from the provider.
+
+    Concurrent requests for the same ticker and range, in this worker or another one, share a single fetch.
+
+    Args:
+        ticker (str): provider symbol, e.g. "AAPL.US".
+        from_date (str): 'YYYY-MM-DD'.
+        to_date (str): 'YYYY-MM-DD'.
+        fetch (callable): fetch(ticker, from_date, to_date) -> DataFrame, EODHD by default.
+        source (str): provider name, keeps each provider's bars apart in the store.
+        level (str): 'daily', 'weekly' or 'monthly' bars.
+
+    Returns:
+        pd.DataFrame: columns date, open, high, low, close, adjusted_close, volume (same shape as the EODHD call).
+
+    Raises:
+        EODHDError / YFinanceError: the fetch failed and nothing is cached for the ticker yet. When some bars are
+            cached, a failed delta fetch is ignored and the cached bars are served.
+    """
+    key = store_key(ticker, source)
+    with _connect() as conn:
+        coverage = get_coverage(conn, key)
+    if missing_ranges(coverage, from_date, to_date):
+        single_flight(("prices", key, from_date, to_date), _sync_bars, key, ticker, from_date, to_date, fetch)
+    return _load(key, from_date, to_date, level)
+
+
+def pending_fetch(ticker, from_date, to_date, source="EODHD"):
+    """
+    What reading ticker's bars would ask the provider for.
+
+    Returns:
+        str | None: None (served from the store), 'tail' (only bars newer than the stored ones) or 'history' (a ticker
+        never fetched, or a range older than the stored one).
+    """
+    with _connect() as conn:
+        coverage = get_coverage(conn, store_key(ticker, source))
+    ranges = missing_ranges(coverage, from_date, to_date)
+    if not ranges:
+        return None
+    return "tail" if coverage is not None and all(start >= coverage[1] for start, _ in ranges) else "history"
+
+
+def get_cached_histories(tickers, from_date, to_date, fetch_many, source, level="daily"):
+    """
+    Batched get_cached_historical_stock_data for providers that download many symbols in one call.
+
+    Args:
+        tickers (list[str]): provider symbols.
+        from_date (str): 'YYYY-MM-DD'.
+        to_date (str): 'YYYY-MM-DD'.
+        fetch_many (callable): fetch_many(tickers, from_date, to_date) -> {ticker: DataFrame or Exception}.
+        source (str): provider name, as in store_key.
+        level (str): 'daily', 'weekly' or 'monthly' bars.
+
+    Returns:
+        dict: ticker -> pd.DataFrame, or the Exception for a ticker that failed and has nothing cached.
+    """
+    keys = {ticker: store_key(ticker, source) for ticker in tickers}
+    with _connect() as conn:
+        stale = sorted(ticker for ticker, key in keys.items()
+                       if missing_ranges(get_coverage(conn, key), from_date, to_date))
+
+    errors = {}
+    if stale:
+        errors = single_flight(("prices", source, tuple(stale), from_date, to_date), _sync_bars_many,
+                               {ticker: keys[ticker] for ticker in stale}, from_date, to_date, fetch_many)
+    return {ticker: errors[ticker] if ticker in errors else _load(key, from_date, to_date, level)
+            for ticker, key in keys.items()}
+
+
+# -------------------------------------- append the nightly bulk end-of-day bars --------------------------------------
+def append_daily_bars(bars, as_of=None, max_gap_days=5):
+    """
+    Store one day's bars for many tickers (from the EODHD bulk endpoint) and extend their coverage.
+
+    Coverage is only extended for tickers whose stored history reaches to within `max_gap_days` of the new bar, so a
+    ticker last fetched weeks ago still gets its gap filled by the next page view. Bars for tickers with no history
+    are stored but don't mark anything as covered.
+
+    Args:
+        bars (pd.DataFrame): 'ticker' (EODHD symbol), 'date' and PRICE_COLUMNS, one row per ticker.
+        as_of (str): 'YYYY-MM-DD' session the bars are current as of (the newest bar date in the whole bulk response,
+            so tickers that didn't trade that day are current too), defaults to each ticker's newest bar date.
+        max_gap_days (int): calendar days allowed between covered_to and the new bar (weekends + holidays).
+
+    Returns:
+        dict: {'stored': n tickers written, 'extended': n tickers whose coverage moved forward, 'behind': tickers
+        stored without extending their coverage (no history yet, or a gap), for a history backfill}
+    """
+    stored = extended = 0
+    behind = []
+    if bars is None or len(bars) == 0:
+        return {"stored": stored, "extended": extended, "behind": behind}
+
+    bars = bars.copy()
+    bars["date"] = pd.to_datetime(bars["date"]).dt.strftime("%Y-%m-%d")
+    now = time.time()
+    with _connect() as conn:
+        for ticker, rows in bars.groupby("ticker", sort=False):
+            store_bars(conn, ticker, rows.drop(columns="ticker"))
+            stored += 1
+
+            coverage = get_coverage(conn, ticker)
+            if coverage is None:
+                behind.append(ticker)
+                continue
+            covered_from, covered_to, _ = coverage
+            first_new, last_new = rows["date"].min(), rows["date"].max()
+            if (date.fromisoformat(first_new) - date.fromisoformat(covered_to)).days > max_gap_days:
+                behind.append(ticker)
+                continue
+            set_coverage(conn, ticker, covered_from, max(covered_to, as_of or last_new, last_new), now)
+            extended += 1
+    return {"stored": stored, "extended": extended, "behind": behind}
@@ -0,0 +1,233 @@
+import os
+import time
+import threading
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED, TimeoutError as FutureTimeoutError
+import numpy as np
+import pandas as pd
+from utils.price_cache import PRICE_COLUMNS
+from utils.price_providers import route
+
+# A request is also sent to the secondary provider once the primary has taken longer than the PRICE_HEDGE_PERCENTILE
+# latency of the same kind of request (provider, single / many, tail delta / full history), so only its slowest few
+# percent are hedged; a cold multi-year download is compared with other cold downloads, not with cache deltas.
+# PRICE_HEDGE_AFTER is the smallest budget (0 turns hedging off); until a kind has PRICE_HEDGE_MIN_SAMPLES timings it
+# isn't hedged on time. A failed primary always falls back to the secondary.
+PRICE_HEDGE_AFTER = float(os.getenv("PRICE_HEDGE_AFTER", 1.5))
+PRICE_HEDGE_PERCENTILE = float(os.getenv("PRICE_HEDGE_PERCENTILE", 95))
+PRICE_HEDGE_MIN_SAMPLES = int(os.getenv("PRICE_HEDGE_MIN_SAMPLES", 20))
+PRICE_HEDGE_WORKERS = int(os.getenv("PRICE_HEDGE_WORKERS", 16))  # threads running provider calls, per web worker
+
+# provider calls run here so a stalled one can be raced (and left to finish into the cache) without blocking the page
+_hedge_pool = ThreadPoolExecutor(max_workers=PRICE_HEDGE_WORKERS, thread_name_prefix="price-hedge")
+
+
+# ------------------------------------------- observed latency per request kind ---------------------------------------
+class LatencyTracker:
+    """Recent successful primary-call latencies per request kind, in this worker."""
+
+    def __init__(self, window=200, percentile=PRICE_HEDGE_PERCENTILE, min_samples=PRICE_HEDGE_MIN_SAMPLES):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self._samples = defaultdict(lambda: deque(maxlen=window))
+        self._lock = threading.Lock()
+
+    def record(self, kind, seconds):
+        with self._lock:
+            self._samples[kind].append(seconds)
+
+    def budget(self, kind):
+        """Hedge budget in seconds for `kind`: its latency percentile, at least PRICE_HEDGE_AFTER; 0 while unknown."""
+        if not PRICE_HEDGE_AFTER:
+            return 0
+        with self._lock:
+            samples = list(self._samples.get(kind, ()))
+        if len(samples) < self.min_samples:
+            return 0
+        return max(PRICE_HEDGE_AFTER, float(np.percentile(samples, self.percentile)))
+
+
+latencies = LatencyTracker()
+
+
+# ---------------------------------------------- hedged provider calls ------------------------------------------------
+def hedged(primary, secondary=None, kind=None, hedge_after=None):
+    """
+    Run primary(); if it hasn't answered within the hedge budget, or fails, also run secondary() and return
+    whichever succeeds first.
+
+    Args:
+        primary (callable): zero-argument call to the primary provider.
+        secondary (callable): the same request against the secondary provider, or None.
+        kind (hashable): request kind the primary's latency is recorded under and its budget taken from.
+        hedge_after (float): latency budget in seconds, overriding latencies.budget(kind) (0: only fall back on
+            failure).
+
+    Returns:
+        (bool, result): (True if the secondary answered, the first successful result)
+
+    Raises:
+        the primary's exception when both fail.
+    """
+    if hedge_after is None:
+        hedge_after = latencies.budget(kind) if kind is not None else PRICE_HEDGE_AFTER
+
+    def timed_primary():
+        started = time.perf_counter()
+        result = primary()
+        if kind is not None:
+            latencies.record(kind, time.perf_counter() - started)
+        return result
+
+    primary_future = _hedge_pool.submit(timed_primary)
+    if secondary is None:
+        return False, primary_future.result()
+    try:
+        return False, primary_future.result(timeout=hedge_after or None)
+    except FutureTimeoutError:
+        pass  # primary is slow: hedge
+    except Exception:
+        pass  # primary failed: fall back
+
+    secondary_future = _hedge_pool.submit(secondary)
+    pending = {primary_future, secondary_future}
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                return future is secondary_future, future.result()
+    return False, primary_future.result()
+
+
+# ------------------------------------------- fetch one price history -------------------------------------------------
+def fetch_price_history(source, symbol, start_date, end_date, level="daily", served_by=False):
+    """
+    Bars for one ticker from its routed primary provider, hedged with the secondary.
+
+    Args:
+        source (str): kw_companies.source ("EODHD" or yfinance).
+        symbol (str): "{ticker}.{code}" / ticker_id.
+        start_date (str): 'YYYY-MM-DD'.
+        end_date (str): 'YYYY-MM-DD'.
+        level (str): 'daily', 'weekly' or 'monthly' bars (precomputed in the price cache, never resampled here).
+        served_by (bool): also return the (provider, provider symbol) that answered, whose cache now holds the bars.
+
+    Returns:
+        pd.DataFrame: date, open, high, low, close, adjusted_close, volume; (frame, (provider, symbol)) with served_by.
+    """
+    (primary, primary_symbol), *rest = route(source, symbol)
+    pending = primary.pending(primary_symbol, start_date, end_date)
+    secondary = None
+    if rest and pending is not None:  # a read the local store serves has nothing to hedge
+        provider, secondary_symbol = rest[0]
+        secondary = lambda: provider.fetch(secondary_symbol, start_date, end_date, level)
+    from_secondary, price_data = hedged(lambda: primary.fetch(primary_symbol, start_date, end_date, level),
+                                        secondary, kind=(primary.name, "one", pending))
+    if served_by:
+        return price_data, rest[0] if from_secondary else (primary, primary_symbol)
+    return price_data
+
+
+def cached_price_history(source, symbol, start_date, end_date, level="daily"):
+    """
+    Bars for one ticker that are already in the local price cache (primary provider's first, then the secondary's),
+    without any upstream call.
+
+    Returns:
+        pd.DataFrame | None: same shape as fetch_price_history, or None when neither provider has bars stored.
+    """
+    for provider, provider_symbol in route(source, symbol):
+        price_data = provider.cached(provider_symbol, start_date, end_date, level)
+        if price_data is not None and len(price_data):
+            return price_data
+    return None
+
+
+# ------------------------------------------ fetch many price histories at once ---------------------------------------
+def _fetch_group(primary, secondary, symbols, start_date, end_date):
+    # symbols: primary symbol -> secondary symbol; the whole group is one hedged fetch_many, then symbols the winning
+    # provider failed on are asked of the other one
+    to_primary = {secondary_symbol: symbol for symbol, secondary_symbol in symbols.items()}
+
+    def call_primary(wanted):
+        return primary.fetch_many(list(wanted), start_date, end_date)
+
+    def call_secondary(wanted):
+        results = secondary.fetch_many([symbols[symbol] for symbol in wanted], start_date, end_date)
+        return {to_primary[symbol]: value for symbol, value in results.items()}
+
+    if secondary is None:
+        return call_primary(symbols)
+
+    pending = {primary.pending(symbol, start_date, end_date) for symbol in symbols}
+    if pending == {None}:  # every symbol is served by the local store
+        return call_primary(symbols)
+    kind = (primary.name, "many", "history" if "history" in pending else "tail")
+    from_secondary, results = hedged(lambda: call_primary(symbols), lambda: call_secondary(symbols), kind=kind)
+    failed = [symbol for symbol, value in results.items() if isinstance(value, Exception)]
+    if failed:
+        other = call_primary if from_secondary else call_secondary
+        results = {**results, **{symbol: value for symbol, value in other(failed).items()
+                                 if not isinstance(value, Exception)}}
+    return results
+
+
+def fetch_price_histories(jobs):
+    """
+    Fetch several price histories at once through the provider layer.
+
+    Tickers are grouped by route and date range; each group is one fetch_many (a batched download for yfinance, a
+    capped fan-out for EODHD) hedged against the secondary provider. One failing ticker does not fail the rest: its
+    slot holds the exception instead of a frame.
+
+    Args:
+        jobs (dict): key -> (source, symbol, start_date, end_date).
+
+    Returns:
+        dict: key -> pd.DataFrame, or the Exception raised while fetching it.
+    """
+    groups = defaultdict(dict)  # (primary, secondary, start, end) -> {primary symbol: secondary symbol}
+    keys = defaultdict(list)  # (group, primary symbol) -> job keys
+    for key, (source, symbol, start_date, end_date) in jobs.items():
+        (primary, primary_symbol), *rest = route(source, symbol)
+        secondary, secondary_symbol = rest[0] if rest else (None, None)
+        group = (primary, secondary, start_date, end_date)
+        groups[group][primary_symbol] = secondary_symbol
+        keys[(group, primary_symbol)].append(key)
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=max(1, len(groups))) as pool:
+        futures = {group: pool.submit(_fetch_group, *group[:2], symbols, *group[2:])
+                   for group, symbols in groups.items()}
+        for group, future in futures.items():
+            try:
+                frames = future.result()
+            except Exception as e:
+                frames = {symbol: e for symbol in groups[group]}
+            for symbol in groups[group]:
+                for key in keys[(group, symbol)]:
+                    results[key] = frames[symbol]
+    return results
+
+
+def price_store_entry(ticker, code, price_data, levels=None):
+    """
+    One price-data-store entry: {'ticker', 'code', 'date': [...], 'close': [...], ..., 'levels': {...}}.
+
+    A failed fetch (an Exception in place of the frame) becomes an entry with no bars, so the page still renders.
+
+    Args:
+        levels (dict): optional {'weekly': frame, 'monthly': frame}; only their date and close are kept, under
+            entry['levels'][level].
+    """
+    if isinstance(price_data, Exception):
+        print(f"price fetch failed for {ticker}: {price_data!r}")
+        price_data = pd.DataFrame(columns=['date', *PRICE_COLUMNS])
+    data_dict = price_data.to_dict(orient="list")
+    data_dict['ticker'] = ticker
+    data_dict['code'] = code
+    if levels:
+        data_dict['levels'] = {level: frame[['date', 'close']].to_dict(orient="list")
+                               for level, frame in levels.items()
+                               if frame is not None and not isinstance(frame, Exception)}
+    return data_dict
@@ -0,0 +1,139 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from utils.price_cache import get_cached_historical_stock_data, get_cached_histories, load_cached_bars, pending_fetch
+from utils import yfinance_functions
+
+# Per-ticker provider overrides, e.g. "SNROF.US=yfinance,VOD.LSE=EODHD" (symbols as stored in kw_companies)
+PRICE_PROVIDER_OVERRIDES = dict(
+    item.split("=", 1) for item in os.getenv("PRICE_PROVIDER_OVERRIDES", "").split(",") if "=" in item
+)
+# EODHD tickers of one page fetched at the same time
+PRICE_FETCH_CONCURRENCY = int(os.getenv("PRICE_FETCH_CONCURRENCY", 6))
+
+# EODHD exchange code -> Yahoo symbol suffix, for the exchanges both providers cover
+EODHD_TO_YAHOO_SUFFIX = {
+    "US": "", "LSE": "L", "TO": "TO", "V": "V", "XETRA": "DE", "F": "F", "PA": "PA", "AS": "AS", "BR": "BR",
+    "MC": "MC", "MI": "MI", "SW": "SW", "ST": "ST", "OL": "OL", "CO": "CO", "HE": "HE", "AU": "AX", "HK": "HK",
+    "KO": "KS", "KQ": "KQ", "SHG": "SS", "SHE": "SZ", "NSE": "NS", "BSE": "BO", "SA": "SA", "MX": "MX", "TW": "TW",
+}
+YAHOO_TO_EODHD_SUFFIX = {suffix: code for code, suffix in EODHD_TO_YAHOO_SUFFIX.items()}
+
+
+# ------------------------------------------------ provider interface -------------------------------------------------
+class PriceProvider:
+    """
+    One source of price bars. Every provider returns frames shaped like the EODHD eod response (date, open, high,
+    low, close, adjusted_close, volume), reads through the local price cache (daily bars plus their weekly / monthly
+    roll-ups) and raises one of utils.price_cache.PRICE_FETCH_ERRORS.
+    """
+
+    name = None
+
+    def fetch(self, symbol, from_date, to_date, level="daily"):
+        """Bars for one of this provider's symbols at `level` ('daily', 'weekly' or 'monthly')."""
+        raise NotImplementedError
+
+    def fetch_many(self, symbols, from_date, to_date, level="daily"):
+        """
+        Bars for several symbols.
+
+        Returns:
+            dict: symbol -> pd.DataFrame, or the Exception for a symbol that failed.
+        """
+        results = {}
+        with ThreadPoolExecutor(max_workers=max(1, min(PRICE_FETCH_CONCURRENCY, len(symbols)))) as pool:
+            futures = {symbol: pool.submit(self.fetch, symbol, from_date, to_date, level) for symbol in symbols}
+            for symbol, future in futures.items():
+                try:
+                    results[symbol] = future.result()
+                except Exception as e:
+                    results[symbol] = e
+        return results
+
+    def pending(self, symbol, from_date, to_date):
+        """What fetching the symbol would ask upstream for: None (a local read), 'tail' or 'history'."""
+        return pending_fetch(symbol, from_date, to_date, source=self.name)
+
+    def cached(self, symbol, from_date, to_date, level="daily"):
+        """Bars for one of this provider's symbols already in the local price cache (None if never fetched)."""
+        return load_cached_bars(symbol, from_date, to_date, source=self.name, level=level)
+
+    def symbol_from(self, other, symbol):
+        """This provider's symbol for `other`'s `symbol`, or None if it doesn't list it."""
+        return symbol if other is self else None
+
+
+class EODHDProvider(PriceProvider):
+    name = "EODHD"
+
+    def fetch(self, symbol, from_date, to_date, level="daily"):
+        return get_cached_historical_stock_data(symbol, from_date=from_date, to_date=to_date, level=level)
+
+    def symbol_from(self, other, symbol):
+        if other is self:
+            return symbol
+        ticker, _, suffix = symbol.rpartition(".") if "." in symbol else (symbol, "", "")
+        code = YAHOO_TO_EODHD_SUFFIX.get(suffix)
+        return None if code is None or not ticker else f"{ticker}.{code}"
+
+
+class YFinanceProvider(PriceProvider):
+    name = "yfinance"
+
+    def fetch(self, symbol, from_date, to_date, level="daily"):
+        return get_cached_historical_stock_data(symbol, from_date=from_date, to_date=to_date,
+                                                fetch=yfinance_functions.get_historical_stock_data, source=self.name,
+                                                level=level)
+
+    def fetch_many(self, symbols, from_date, to_date, level="daily"):
+        # one batched download for every symbol the cache doesn't already hold
+        return get_cached_histories(symbols, from_date, to_date,
+                                    fetch_many=yfinance_functions.get_historical_stock_data_many, source=self.name,
+                                    level=level)
+
+    def symbol_from(self, other, symbol):
+        if other is self:
+            return symbol
+        ticker, _, code = symbol.rpartition(".")
+        suffix = EODHD_TO_YAHOO_SUFFIX.get(code)
+        if suffix is None or not ticker:
+            return None
+        return f"{ticker}.{suffix}" if suffix else ticker
+
+
+PROVIDERS = {provider.name: provider for provider in (EODHDProvider(), YFinanceProvider())}
+
+
+# ----------------------------------------------------- routing ------------------------------------------------------
+def get_provider(source):
+    """Provider for a kw_companies source; anything that isn't EODHD has always meant yfinance."""
+    return PROVIDERS.get(source) or PROVIDERS["yfinance"]
+
+
+def route(source, symbol):
+    """
+    Providers to ask for a ticker, primary first.
+
+    Args:
+        source (str): kw_companies.source for the ticker.
+        symbol (str): the ticker's symbol with that source, e.g. "AAPL.US".
+
+    Returns:
+        list[(PriceProvider, str)]: (provider, provider symbol); the secondary is left out when it doesn't list the
+        ticker.
+    """
+    primary = get_provider(PRICE_PROVIDER_OVERRIDES.get(symbol, source))
+    source_provider = get_provider(source)
+    primary_symbol = primary.symbol_from(source_provider, symbol)
+    if primary_symbol is None:  # override to a provider that can't translate the symbol
+        primary, primary_symbol = source_provider, symbol
+
+    routes = [(primary, primary_symbol)]
+    for provider in PROVIDERS.values():
+        if provider is not primary:
+            secondary_symbol = provider.symbol_from(primary, primary_symbol)
+            if secondary_symbol is not None:
+                routes.append((provider, secondary_symbol))
+                break
+    return routes
+
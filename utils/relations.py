@@ -0,0 +1,92 @@
+import os
+import json
+import time
+import hashlib
+import tempfile
+from datetime import datetime
+from utils.helpers import get_corr, get_lead_lag, get_trend_series
+from utils.price_fetch import cached_price_history, price_store_entry
+from utils.compute import run_task
+
+# Correlation / lead-lag figures for a keyword's related tickers are cached on disk and computed from the local price
+# cache only, so the trend page never downloads every related ticker's history
+RELATION_CACHE_DIR = os.getenv("RELATION_CACHE_DIR", os.path.join("cache", "relations"))
+RELATION_CACHE_TTL = int(os.getenv("RELATION_CACHE_TTL", 6 * 3600))  # seconds; new daily bars barely move these
+
+
+def relation_key(data, stocks):
+    """Cache key for a kw_joined row and its kw_companies rows; changes whenever the trend data or tickers change."""
+    symbols = sorted(f"{s['ticker']}.{s['code']}" for s in stocks)
+    raw = "\x1f".join([data['keyword'], data['type'], data['trend'], data['trend_st'] or "", *symbols])
+    return hashlib.blake2b(raw.encode(), digest_size=16).hexdigest()
+
+
+def read_relation_cache(key, ttl=RELATION_CACHE_TTL):
+    """Cached {'corr': [...], 'lead_lag': [...]} for key, or None if missing or older than ttl."""
+    path = os.path.join(RELATION_CACHE_DIR, f"{key}.json")
+    try:
+        if time.time() - os.path.getmtime(path) > ttl:
+            return None
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_relation_cache(key, relations):
+    os.makedirs(RELATION_CACHE_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=RELATION_CACHE_DIR, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(relations, f)
+        os.replace(tmp_path, os.path.join(RELATION_CACHE_DIR, f"{key}.json"))
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+# --------------------------------------- correlations for every related ticker ---------------------------------------
+def get_relations(data, stocks, tag=None):
+    """
+    Long/short-term correlation and lead/lag for every ticker related to a keyword.
+
+    Served from the disk cache when fresh. Otherwise the figures are computed in the compute pool from the bars already
+    in the local price cache (kept current by jobs/refresh_eod.py and by the tickers visitors overlay), with no
+    upstream download; a ticker with no stored bars is left out until its history is loaded, and such a partial
+    result isn't cached.
+
+    Args:
+        data (dict): kw_joined row.
+        stocks (list[dict]): kw_companies rows (ticker, code, source) for the row's tickers.
+        tag (tuple): utils.compute.page_tag() of the requesting page.
+
+    Returns:
+        dict: {'corr': get_corr(...) output, 'lead_lag': get_lead_lag(...) output}
+
+    Raises:
+        ComputeError: the compute pool was busy, timed out or the task was cancelled.
+    """
+    key = relation_key(data, stocks)
+    relations = read_relation_cache(key)
+    if relations is not None:
+        return relations
+
+    trend_dates, _ = get_trend_series(data['trend'])
+    start_date = str(trend_dates[0])
+    end_date = datetime.today().strftime("%Y-%m-%d")
+    histories = {stock['ticker']: cached_price_history(stock['source'], f"{stock['ticker']}.{stock['code']}",
+                                                       start_date, end_date)
+                 for stock in stocks}
+    price_data = [price_store_entry(stock['ticker'], stock['code'], histories[stock['ticker']])
+                  for stock in stocks if histories[stock['ticker']] is not None]
+
+    relations = {'corr': [], 'lead_lag': []}
+    if price_data:
+        relations = {
+            'corr': run_task(get_corr, data['trend'], data['trend_st'], price_data, tag=tag),
+            'lead_lag': run_task(get_lead_lag, data['trend'], price_data, tag=tag),
+        }
+    # don't pin a partial result for the whole TTL while a ticker's history isn't stored yet
+    if len(price_data) == len(stocks):
+        write_relation_cache(key, relations)
+    return relations
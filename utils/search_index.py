@@ -0,0 +1,243 @@
+import os
+import time
+import re
+import threading
+from bisect import bisect_left, bisect_right
+import numpy as np
+
+# The header search is served from an index held in each web worker. Every SEARCH_INDEX_CHECK_INTERVAL seconds a
+# search checks the data version (row count and latest SEARCH_INDEX_VERSION_COLUMN of kw_companies and kw_joined) and
+# rebuilds when it moved, so inserts, deletes, renames and edits all show up; after SEARCH_INDEX_MAX_AGE seconds the
+# index is rebuilt regardless, as a backstop for writes that don't bump the column.
+SEARCH_INDEX_CHECK_INTERVAL = float(os.getenv("SEARCH_INDEX_CHECK_INTERVAL", 60))
+SEARCH_INDEX_MAX_AGE = float(os.getenv("SEARCH_INDEX_MAX_AGE", 6 * 3600))
+# last-modified timestamp both tables keep (set on insert and by an update trigger)
+SEARCH_INDEX_VERSION_COLUMN = os.getenv("SEARCH_INDEX_VERSION_COLUMN", "updated_at")
+SEARCH_RESULTS = int(os.getenv("SEARCH_RESULTS", 20))  # options returned per keystroke
+# share of the query's trigrams an option must contain to match without a prefix match
+SEARCH_MIN_SIMILARITY = float(os.getenv("SEARCH_MIN_SIMILARITY", 0.45))
+
+_NON_WORD = re.compile(r"[^\w]+")
+
+
+# ---------------------------------------------- rows -> dropdown options ---------------------------------------------
+def fetch_rows(client, table, columns, page_size=1000):
+    """Every row of `table` (only `columns`), paged so PostgREST's row cap doesn't cut the list short."""
+    rows, start = [], 0
+    while True:
+        page = client.table(table).select(columns).range(start, start + page_size - 1).execute().data
+        rows += page
+        if len(page) < page_size:
+            return rows
+        start += page_size
+
+
+def fetch_version(client, column=SEARCH_INDEX_VERSION_COLUMN):
+    """
+    Cheap data version: (row count, latest `column`) of kw_companies and kw_joined, one single-row request per table.
+
+    The count catches deletes (which leave the latest timestamp alone); the timestamp catches inserts, renames and
+    edits that keep the count.
+    """
+    version = []
+    for table in ("kw_companies", "kw_joined"):
+        response = (client.table(table).select(column, count="exact")
+                    .order(column, desc=True, nullsfirst=False).limit(1).execute())
+        version.append((response.count, response.data[0][column] if response.data else None))
+    return tuple(version)
+
+
+def build_entries(kw_companies, kw_joined):
+    """
+    Dropdown options for every company and trend, sorted by label.
+
+    Returns:
+        list[dict]: {'value': page url, 'label': shown text, 'name': searchable name, 'code': ticker_id or ""}
+    """
+    entries = []
+    for company_dict in kw_companies:
+        entries.append({
+            'value': f"/company?company={company_dict['ticker_id']}#query",
+            'label': f"Company: {company_dict['full_name']} ({company_dict['ticker_id']})",
+            'name': company_dict['full_name'] or "",
+            'code': company_dict['ticker_id'],
+        })
+    for kw_dict in kw_joined:
+        entries.append({
+            'value': f"/trend?trend={kw_dict['keyword']}&source={kw_dict['type']}#query",
+            'label': f"Trend: {kw_dict['keyword']} ({kw_dict['type']})",
+            'name': kw_dict['keyword'] or "",
+            'code': "",  # the source is shared by thousands of trends, so it isn't searched
+        })
+    return sorted(entries, key=lambda x: x['label'])
+
+
+# ---------------------------------------------------- trigrams -------------------------------------------------------
+def normalize(text):
+    """Lowercase, punctuation to spaces, whitespace collapsed: 'Pop Mart (9992.HK)' -> 'pop mart 9992 hk'."""
+    return " ".join(_NON_WORD.sub(" ", (text or "").lower()).split())
+
+
+def trigrams(text):
+    """
+    Set of trigrams of a normalized text, each word padded like pg_trgm ('  w', ' wo', ..., 'rd ') so word starts and
+    ends count and transposed or dropped letters still share most of them.
+    """
+    grams = set()
+    for word in text.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+# ------------------------------------------------- search index ------------------------------------------------------
+class SearchIndex:
+    """
+    Fuzzy search over the header dropdown options.
+
+    Two structures are built per data version:
+      - a trigram inverted index: every trigram of an option's name and code points at the options containing it,
+        stored as one numpy array of option ids ordered by trigram (CSR), so scoring a query is one bincount over the
+        posting lists of its trigrams;
+      - sorted key lists (name and code, then every later word of the name) for exact and prefix matches.
+
+    Ranking, best first: exact name or code, name or code prefix, word prefix, then trigram similarity (the share of
+    the query's trigrams an option contains, with Jaccard similarity as the tie-break so closer-length names win).
+    Options with no prefix match need SEARCH_MIN_SIMILARITY of the query's trigrams, which lets typos like "popmrt"
+    through. Ties keep label order.
+
+    `load()` returns the options (see build_entries) and `version()` any comparable data version; both run on the
+    searching request's thread, at most one rebuild at a time, while other requests keep using the previous index.
+    """
+
+    def __init__(self, load, version, check_interval=SEARCH_INDEX_CHECK_INTERVAL, max_age=SEARCH_INDEX_MAX_AGE):
+        self.load = load
+        self.version = version
+        self.check_interval = check_interval
+        self.max_age = max_age
+        self.data_version = None
+        self.built_at = 0.0
+        self.checked_at = 0.0
+        self._index = None  # dict built by _build, swapped whole so searches never see a mix
+        self._build_lock = threading.Lock()
+
+    @staticmethod
+    def _build(entries):
+        gram_ids = {}
+        gram_of, entry_of = [], []  # one (trigram id, option id) pair per posting
+        gram_counts = np.zeros(len(entries), dtype=np.int32)
+        starts, words = [], []  # (key, option id)
+        for i, entry in enumerate(entries):
+            name, code = normalize(entry['name']), normalize(entry['code'])
+            grams = trigrams(name) | trigrams(code)
+            gram_counts[i] = len(grams)
+            for gram in grams:
+                gram_of.append(gram_ids.setdefault(gram, len(gram_ids)))
+                entry_of.append(i)
+            starts += [(key, i) for key in (name, code) if key]
+            words += [(word, i) for word in name.split()[1:]]
+
+        gram_of = np.asarray(gram_of, dtype=np.int32)
+        order = np.argsort(gram_of, kind="stable")
+        postings = np.asarray(entry_of, dtype=np.int32)[order]
+        offsets = np.zeros(len(gram_ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(gram_of, minlength=len(gram_ids)), out=offsets[1:])
+
+        def key_list(pairs):
+            pairs.sort()
+            return [key for key, _ in pairs], np.asarray([i for _, i in pairs], dtype=np.int32)
+
+        return {
+            'entries': entries,
+            'by_value': {entry['value']: entry for entry in entries},
+            'gram_ids': gram_ids,
+            'postings': postings,
+            'offsets': offsets,
+            'gram_counts': gram_counts,
+            'starts': key_list(starts),
+            'words': key_list(words),
+        }
+
+    def refresh(self, force=False):
+        """
+        Rebuild when forced, too old or the data version moved. A no-op while another thread is rebuilding, and a
+        failed rebuild keeps the previous index until the next check.
+        """
+        if not force and self._index is not None and time.monotonic() - self.checked_at < self.check_interval:
+            return
+        if not self._build_lock.acquire(blocking=self._index is None):
+            return
+        try:
+            now = time.monotonic()
+            if not force and self._index is not None and now - self.checked_at < self.check_interval:
+                return
+            self.checked_at = now
+            version = self.version()
+            if force or self._index is None or version != self.data_version or now - self.built_at >= self.max_age:
+                self._index = self._build(self.load())
+                self.data_version = version
+                self.built_at = now
+        except Exception as e:
+            if self._index is None:
+                raise
+            print(f"search index refresh failed, serving the previous one: {e!r}")
+        finally:
+            self._build_lock.release()
+
+    def invalidate(self):
+        """Rebuild on the next search."""
+        self.checked_at = float("-inf")
+        self.data_version = None
+
+    def get(self, value):
+        """The option for a dropdown value, or None."""
+        self.refresh()
+        return self._index['by_value'].get(value)
+
+    def search(self, query, k=SEARCH_RESULTS):
+        """
+        Top-k options for what the user typed, typos included.
+
+        Args:
+            query (str): the typed text; case and punctuation are ignored.
+            k (int): number of options to return.
+
+        Returns:
+            list[dict]: {'value', 'label'} options, best first.
+        """
+        self.refresh()
+        query = normalize(query)
+        if not query:
+            return []
+        index = self._index
+        entries = index['entries']
+        score = np.zeros(len(entries), dtype=np.float32)
+
+        # prefix tiers: 3 exact name/code, 2 name/code prefix, 1 word prefix
+        for (keys, ids), tier in ((index['words'], 1), (index['starts'], 2)):
+            lo = bisect_left(keys, query)
+            hi = bisect_left(keys, query + "\uffff", lo)
+            score[ids[lo:hi]] = np.maximum(score[ids[lo:hi]], tier)
+            if tier == 2:
+                score[ids[lo:bisect_right(keys, query, lo, hi)]] = 3
+
+        # trigram similarity
+        gram_ids = [index['gram_ids'][gram] for gram in trigrams(query) if gram in index['gram_ids']]
+        if gram_ids:
+            offsets, postings = index['offsets'], index['postings']
+            hits = np.concatenate([postings[offsets[g]:offsets[g + 1]] for g in gram_ids])
+            shared = np.bincount(hits, minlength=len(entries)).astype(np.float32)
+            n_query = len(trigrams(query))
+            containment = shared / n_query
+            jaccard = shared / (n_query + index['gram_counts'] - shared)
+            fuzzy = np.where(containment >= SEARCH_MIN_SIMILARITY, 0.9 * containment + 0.1 * jaccard, 0)
+            score += fuzzy
+
+        candidates = np.flatnonzero(score)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-score[candidates], k - 1)[:k]]
+            # argpartition leaves ties at the k-th score arbitrary: take every candidate tied with it, in label order
+            cutoff = score[candidates].min()
+            candidates = np.union1d(candidates[score[candidates] > cutoff], np.flatnonzero(score == cutoff))
+        top = candidates[np.lexsort((candidates, -score[candidates]))][:k]
+        return [{'value': entries[i]['value'], 'label': entries[i]['label']} for i in top]
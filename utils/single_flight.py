@@ -0,0 +1,142 @@
+import os
+import time
+import hashlib
+import threading
+from contextlib import contextmanager, nullcontext
+
+try:
+    import fcntl
+except ImportError:  # Windows: coalescing stays per process
+    fcntl = None
+
+# Identical upstream fetches are coalesced: one call per key at a time, inside a worker (shared result) and across
+# gunicorn workers (flock on a lock file)
+SINGLE_FLIGHT_LOCK_DIR = os.getenv("SINGLE_FLIGHT_LOCK_DIR", os.path.join("cache", "locks"))
+SINGLE_FLIGHT_LOCK_TIMEOUT = float(os.getenv("SINGLE_FLIGHT_LOCK_TIMEOUT", 60))  # then proceed without the lock
+SINGLE_FLIGHT_LOCK_FILES = 256  # keys are hashed onto a fixed set of lock files so the directory doesn't grow
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+_calls = {}  # key -> _Call in flight in this process
+_calls_lock = threading.Lock()
+_held = {}  # lock file path -> [open lock file, holders] for the buckets this process holds
+_held_lock = threading.Lock()
+_local = threading.local()  # .depth: single_flight calls running on this thread
+
+
+# ------------------------------------------- cross-process lock per key ----------------------------------------------
+def _lock_path(key):
+    digest = hashlib.blake2b(repr(key).encode(), digest_size=8).digest()
+    bucket = int.from_bytes(digest, "big") % SINGLE_FLIGHT_LOCK_FILES
+    return os.path.join(SINGLE_FLIGHT_LOCK_DIR, f"{bucket:03d}.lock")
+
+
+def _acquire(path, timeout):
+    # (open lock file, whether the flock was taken before the deadline)
+    f = open(path, "a")
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return f, True
+        except BlockingIOError:
+            if time.monotonic() >= deadline:
+                return f, False
+            time.sleep(0.05)
+
+
+@contextmanager
+def file_lock(key, timeout=SINGLE_FLIGHT_LOCK_TIMEOUT):
+    """
+    Exclusive flock shared by every process on the host for `key`.
+
+    Re-entrant within a process: keys share a bucket (lock file), and a key whose bucket this process already holds
+    joins that lock instead of waiting for it to be released. Gives up waiting after `timeout`
+    seconds and runs unlocked, so a stuck holder can't block other workers forever. A no-op where fcntl is
+    unavailable.
+    """
+    if fcntl is None:
+        yield
+        return
+
+    path = _lock_path(key)
+    with _held_lock:
+        held = _held.get(path)
+        if held is not None:
+            held[1] += 1
+    if held is None:
+        os.makedirs(SINGLE_FLIGHT_LOCK_DIR, exist_ok=True)
+        f, locked = _acquire(path, timeout)
+        if not locked:
+            try:
+                yield
+            finally:
+                f.close()
+            return
+        with _held_lock:
+            held = _held[path] = [f, 1]
+
+    try:
+        yield
+    finally:
+        with _held_lock:
+            held[1] -= 1
+            release = held[1] == 0
+            if release:
+                del _held[path]
+        if release:
+            fcntl.flock(held[0], fcntl.LOCK_UN)
+            held[0].close()
+
+
+# ------------------------------------------------ single flight ------------------------------------------------------
+def single_flight(key, fn, *args, **kwargs):
+    """
+    Call fn(*args, **kwargs) unless an identical call (same `key`) is already in flight, in which case wait for it and
+    return its result (or raise its exception).
+
+    Within a process the waiting callers share the leader's result object, so treat it as read-only. Across processes
+    the call is serialised with file_lock(key); fn should re-check its cache once it runs so a second worker reuses
+    what the first one stored instead of fetching again. Only the outermost single_flight call on a thread takes the
+    file lock: a nested call (e.g. the EODHD request inside a price-cache sync) already runs under it, and locking
+    inner keys too would let two workers take the same pair of buckets in opposite order.
+
+    Args:
+        key (hashable): identifies the upstream request, e.g. ("eodhd", path, params).
+        fn (callable): the fetch.
+
+    Returns:
+        whatever fn returns.
+    """
+    with _calls_lock:
+        call = _calls.get(key)
+        leader = call is None
+        if leader:
+            call = _calls[key] = _Call()
+
+    if not leader:
+        call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    depth = getattr(_local, "depth", 0)
+    _local.depth = depth + 1
+    try:
+        with file_lock(key) if depth == 0 else nullcontext():
+            call.result = fn(*args, **kwargs)
+        return call.result
+    except BaseException as e:
+        call.error = e
+        raise
+    finally:
+        _local.depth = depth
+        with _calls_lock:
+            _calls.pop(key, None)
+        call.done.set()
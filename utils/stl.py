@@ -0,0 +1,229 @@
+import os
+import glob
+import hashlib
+import tempfile
+import numpy as np
+import pandas as pd
+from statsmodels.tsa.seasonal import STL
+from utils.helpers import get_trend_series
+from utils.compute import run_task
+
+# STL results are cached on disk so every gunicorn worker on the host shares them
+STL_CACHE_DIR = os.getenv("STL_CACHE_DIR", os.path.join("cache", "stl"))
+# columnar store written by jobs/precompute_stl.py
+STL_STORE_PATH = os.getenv("STL_STORE_PATH", os.path.join("cache", "stl_store.npz"))
+STL_FIELDS = ("date", "observed", "trend", "seasonal", "residual", "momentum")
+STL_PERIODS = {"Long Term": 3, "Short Term": 7}  # quarterly on monthly data, weekly on daily data
+
+
+def stl_input(data, period):
+    """
+    The trend string and STL period to decompose for a kw_joined row.
+
+    Args:
+        data (dict): kw_joined row with 'trend', 'trend_projected' and 'trend_st'.
+        period (str): 'Long Term' or 'Short Term'.
+
+    Returns:
+        (str, int): (data_str, stl_period)
+    """
+    if period == 'Long Term':
+        return data['trend'] + ', ' + data['trend_projected'], STL_PERIODS[period]
+    elif period == 'Short Term':
+        return data['trend_st'], STL_PERIODS[period]
+    raise ValueError(f"invalid period: {period}")
+
+
+# ----------------------------------------- run STL on a parsed trend series ------------------------------------------
+def compute_stl(dates, volumes, period):
+    """
+    Seasonal-Trend decomposition of a trend series.
+
+    The last point is dropped (the current month/week is incomplete), components are rounded to whole numbers and
+    momentum is the first difference of the trend component.
+
+    Args:
+        dates (np.ndarray): datetime64[D] dates.
+        volumes (np.ndarray): int volumes.
+        period (int): STL period (3 = quarterly on monthly data, 7 = weekly on daily data).
+
+    Returns:
+        dict: arrays keyed by STL_FIELDS.
+    """
+    df = pd.DataFrame({"Volume": volumes}, index=pd.DatetimeIndex(dates.astype("datetime64[ns]"), name="Date"))
+    df = df.iloc[:-1]
+    res = STL(df['Volume'], period=period).fit()
+
+    trend = np.round(np.asarray(res.trend)).astype(np.int64)
+    momentum = np.empty(len(trend), dtype=float)
+    momentum[:1] = np.nan
+    momentum[1:] = np.diff(trend)
+
+    return {
+        "date": np.asarray(dates[:-1], dtype="datetime64[D]"),
+        "observed": np.round(np.asarray(res.observed)).astype(np.int64),
+        "trend": trend,
+        "seasonal": np.round(np.asarray(res.seasonal)).astype(np.int64),
+        "residual": np.round(np.asarray(res.resid)).astype(np.int64),
+        "momentum": momentum,
+    }
+
+
+# ----------------------------------------- on-disk STL cache shared by workers ---------------------------------------
+def hash_trend(data_str):
+    """Content hash of a trend string, used to invalidate cached results when the data changes."""
+    return hashlib.blake2b((data_str or "").encode(), digest_size=16).hexdigest()
+
+
+def _cache_prefix(keyword, kw_type, period):
+    name = hashlib.blake2b(f"{keyword}\x1f{kw_type}\x1f{period}".encode(), digest_size=12).hexdigest()
+    return os.path.join(STL_CACHE_DIR, name)
+
+
+def read_stl_cache(keyword, kw_type, period, data_hash):
+    """Return the cached STL components for this key and data hash, or None."""
+    path = f"{_cache_prefix(keyword, kw_type, period)}_{data_hash}.npz"
+    try:
+        with np.load(path) as npz:
+            return {field: npz[field] for field in STL_FIELDS}
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def write_stl_cache(keyword, kw_type, period, data_hash, components):
+    """
+    Atomically store STL components and remove entries for older versions of the same keyword/type/period.
+    """
+    os.makedirs(STL_CACHE_DIR, exist_ok=True)
+    prefix = _cache_prefix(keyword, kw_type, period)
+    path = f"{prefix}_{data_hash}.npz"
+
+    fd, tmp_path = tempfile.mkstemp(dir=STL_CACHE_DIR, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, **{field: components[field] for field in STL_FIELDS})
+        os.replace(tmp_path, path)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return
+
+    for stale in glob.glob(f"{glob.escape(prefix)}_*.npz"):
+        if stale != path:
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+
+
+# ------------------------------------- columnar STL store (precomputed offline) --------------------------------------
+def store_key(keyword, kw_type, period):
+    return f"{keyword}\x1f{kw_type}\x1f{period}"
+
+
+def write_stl_store(path, entries):
+    """
+    Write STL results for many keywords into one columnar .npz file.
+
+    Each field is stored as one concatenated array with an offsets array marking where every entry starts, so the
+    whole universe loads with a handful of reads.
+
+    Args:
+        path (str): output file.
+        entries (list[(str, str, dict)]): (store_key, data_hash, components) per keyword/type/period.
+    """
+    lengths = [len(components["date"]) for _, _, components in entries]
+    columns = {
+        "keys": np.array([key for key, _, _ in entries], dtype=str),
+        "hashes": np.array([data_hash for _, data_hash, _ in entries], dtype=str),
+        "offsets": np.concatenate(([0], np.cumsum(lengths))).astype(np.int64),
+    }
+    for field in STL_FIELDS:
+        arrays = [components[field] for _, _, components in entries]
+        columns[field] = np.concatenate(arrays) if arrays else np.empty(0)
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, **columns)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class STLStore:
+    """Read side of the columnar store. Reloads automatically when the job replaces the file."""
+
+    def __init__(self, path):
+        self.path = path
+        self._state = (None, {}, {})  # (mtime, key -> row, columns), swapped in one assignment
+
+    def _load(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            self._state = (None, {}, {})
+            return self._state
+        if mtime != self._state[0]:
+            with np.load(self.path) as npz:
+                columns = {name: npz[name] for name in npz.files}
+            index = {key: i for i, key in enumerate(columns["keys"].tolist())}
+            self._state = (mtime, index, columns)
+        return self._state
+
+    def entries(self):
+        """Yield (store_key, data_hash, components) for every stored entry."""
+        _, index, columns = self._load()
+        for key, i in index.items():
+            yield key, str(columns["hashes"][i]), self._slice(columns, i)
+
+    def get(self, key, data_hash):
+        _, index, columns = self._load()
+        i = index.get(key)
+        if i is None or columns["hashes"][i] != data_hash:
+            return None
+        return self._slice(columns, i)
+
+    @staticmethod
+    def _slice(columns, i):
+        start, end = columns["offsets"][i], columns["offsets"][i + 1]
+        return {field: columns[field][start:end] for field in STL_FIELDS}
+
+
+stl_store = STLStore(STL_STORE_PATH)
+
+
+def _compute_and_cache_stl(keyword, kw_type, period, data_hash, dates, volumes, stl_period):
+    # runs in the compute pool and writes the cache itself, so a decomposition the page stopped waiting for
+    # (ComputeTimeout) is still there on the next request
+    components = compute_stl(dates, volumes, stl_period)
+    write_stl_cache(keyword, kw_type, period, data_hash, components)
+    return components
+
+
+def get_stl(keyword, kw_type, period, data_str, stl_period, tag=None):
+    """
+    STL components for a keyword: from the precomputed columnar store, else the per-keyword disk cache, else
+    computed in the compute pool, whose worker stores it in the per-keyword cache even if this call times out.
+
+    Args:
+        keyword (str): kw_joined keyword.
+        kw_type (str): kw_joined type ('Google Search' or 'Tiktok').
+        period (str): 'Long Term' or 'Short Term'.
+        data_str (str): the trend string being decomposed.
+        stl_period (int): STL period.
+        tag (tuple): utils.compute.page_tag() of the requesting page, so a navigation away cancels the task.
+
+    Returns:
+        dict: arrays keyed by STL_FIELDS.
+    """
+    data_hash = hash_trend(data_str)
+    components = stl_store.get(store_key(keyword, kw_type, period), data_hash)
+    if components is None:
+        components = read_stl_cache(keyword, kw_type, period, data_hash)
+    if components is None:
+        components = run_task(_compute_and_cache_stl, keyword, kw_type, period, data_hash,
+                              *get_trend_series(data_str), stl_period, tag=tag, cancel_on_timeout=False)
+    return components
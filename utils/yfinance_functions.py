@@ -0,0 +1,101 @@
+import threading
+from datetime import date, timedelta
+import pandas as pd
+import yfinance as yf
+from utils.single_flight import single_flight
+
+# yfinance columns -> the EODHD eod columns the rest of the app uses
+YF_COLUMNS = {
+    "Date": "date",
+    "Open": "open",
+    "High": "high",
+    "Low": "low",
+    "Close": "close",
+    "Adj Close": "adjusted_close",
+    "Volume": "volume",
+}
+
+# yf.download keeps its results in module-level dicts, so concurrent calls can mix up tickers
+_yf_lock = threading.Lock()
+
+
+class YFinanceError(Exception):
+    """yfinance returned no data for a symbol, or the download failed."""
+
+
+# ------------------------------------------- one download, many symbols ----------------------------------------------
+def _download(symbols, from_date, to_date):
+    # yfinance's end is exclusive, EODHD's `to` is inclusive
+    end = (date.fromisoformat(to_date) + timedelta(days=1)).isoformat()
+    with _yf_lock:
+        return yf.download(list(symbols), start=from_date, end=end, group_by="ticker", auto_adjust=False,
+                           threads=True, progress=False)
+
+
+def split_download(raw, symbols):
+    """
+    Split a multi-symbol yf.download frame into one frame per symbol, shaped like the EODHD eod response.
+
+    Args:
+        raw (pd.DataFrame): yf.download(..., group_by="ticker") result, columns (Ticker, Price).
+        symbols (list[str]): the symbols that were requested.
+
+    Returns:
+        dict: symbol -> pd.DataFrame (date, open, high, low, close, adjusted_close, volume), or YFinanceError when
+        the symbol came back empty.
+    """
+    frames = {}
+    for symbol in symbols:
+        if isinstance(raw.columns, pd.MultiIndex):
+            if symbol not in raw.columns.get_level_values(0):
+                frames[symbol] = YFinanceError(f"no data for {symbol}")
+                continue
+            df = raw[symbol]
+        else:  # older yfinance returns flat columns for a single symbol
+            df = raw
+
+        # symbols on other calendars leave all-NaN rows in the shared index
+        df = df.dropna(how="all").reset_index()
+        df.columns = [YF_COLUMNS.get(col, str(col).lower()) for col in df.columns]
+        if df.empty:
+            frames[symbol] = YFinanceError(f"no data for {symbol}")
+            continue
+        frames[symbol] = df[[col for col in YF_COLUMNS.values() if col in df.columns]]
+    return frames
+
+
+def get_historical_stock_data_many(symbols, from_date, to_date):
+    """
+    Daily bars for several symbols from one yf.download call.
+
+    Identical concurrent requests share one download (see utils.single_flight).
+
+    Args:
+        symbols (list[str]): yfinance symbols.
+        from_date (str): 'YYYY-MM-DD'.
+        to_date (str): 'YYYY-MM-DD', inclusive like EODHD.
+
+    Returns:
+        dict: symbol -> pd.DataFrame shaped like utils.EODHD_functions.get_historical_stock_data, or YFinanceError.
+    """
+    symbols = sorted(set(symbols))
+    if not symbols:
+        return {}
+    try:
+        raw = single_flight(("yfinance", tuple(symbols), from_date, to_date), _download, symbols, from_date, to_date)
+    except Exception as e:
+        error = YFinanceError(f"yfinance download failed: {e!r}")
+        return {symbol: error for symbol in symbols}
+    try:
+        return split_download(raw, symbols)
+    except Exception as e:  # a frame layout split_download doesn't know
+        error = YFinanceError(f"unreadable yfinance download: {e!r}")
+        return {symbol: error for symbol in symbols}
+
+
+def get_historical_stock_data(ticker, from_date, to_date):
+    """Daily bars for one symbol, same signature and shape as the EODHD call. Raises YFinanceError on failure."""
+    df = get_historical_stock_data_many([ticker], from_date, to_date)[ticker]
+    if isinstance(df, Exception):
+        raise df
+    return df